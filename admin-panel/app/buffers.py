@@ -0,0 +1,120 @@
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+import atexit
+import logging
+import threading
+
+from .models import User, UserActivity
+
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter(ABC):
+    """
+    Collects writes in memory and flushes them in one batch at most every
+    `interval` seconds (read from settings). A daemon timer guarantees the
+    flush happens even without further traffic, and pending writes are
+    flushed on interpreter exit. An interval of 0 writes through.
+    """
+    interval_setting = None
+    default_interval = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = self.empty()
+        self._timer = None
+        atexit.register(self.flush)
+
+    @property
+    def interval(self):
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    def empty(self):
+        return {}
+
+    @abstractmethod
+    def merge(self, pending, items):
+        """Fold new `items` into the `pending` batch in place"""
+
+    @abstractmethod
+    def write(self, pending):
+        """Persist one batch, all or nothing, so a failed flush can be retried"""
+
+    def add(self, items):
+        with self._lock:
+            self.merge(self._pending, items)
+            if self.interval > 0 and self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.interval <= 0:
+            self.flush()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, self.empty()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+        try:
+            self.write(pending)
+        except IntegrityError:
+            # Retrying can't fix bad data and would block every later flush
+            logger.exception("%s flush failed, dropping %d writes", type(self).__name__, len(pending))
+        except Exception:
+            logger.exception("%s flush failed, keeping writes for the next flush", type(self).__name__)
+            with self._lock:
+                self.merge(self._pending, pending)
+
+
+class ActivityLog(BufferedWriter):
+    """
+    Buffered user activity. Each flush sets User.last_active for every user
+    seen with one bulk UPDATE and, unless ACTIVITY_LOG is off, records the
+    (user, day) pairs in UserActivity.
+    """
+    interval_setting = 'ACTIVITY_FLUSH_INTERVAL'
+
+    def merge(self, pending, items):
+        for key, (first, last) in items.items():
+            if key in pending:
+                first = min(first, pending[key][0])
+                last = max(last, pending[key][1])
+            pending[key] = (first, last)
+
+    def record(self, user_id, when=None):
+        when = when or timezone.now()
+        self.add({(user_id, timezone.localdate(when)): (when, when)})
+
+    def write(self, pending):
+        last_seen = {}
+        for (user_id, day), (first, last) in pending.items():
+            last_seen[user_id] = max(last, last_seen.get(user_id, last))
+
+        with transaction.atomic():
+            # Users deleted since their requests were buffered are skipped
+            existing = set(User.objects.filter(pk__in=last_seen).values_list('pk', flat=True))
+            User.objects.bulk_update(
+                [User(pk=user_id, last_active=last) for user_id, last in last_seen.items() if user_id in existing],
+                ['last_active'],
+                batch_size=500,
+            )
+            if getattr(settings, 'ACTIVITY_LOG', True):
+                UserActivity.objects.bulk_create([
+                    UserActivity(user_id=user_id, date=day, first_seen=first)
+                    for (user_id, day), (first, last) in pending.items() if user_id in existing
+                ], batch_size=500, ignore_conflicts=True)
+
+
+activity_log = ActivityLog()
@@ -0,0 +1,159 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from functools import wraps
+import hashlib
+import threading
+import time
+import uuid
+
+
+# key -> (version, monotonic time it was read)
+_versions = {}
+
+
+def version_table():
+    # Looked up lazily: models.py itself imports this module
+    return apps.get_model('app', 'CacheVersion').objects
+
+
+def get_version(key):
+    """
+    Version stamp of `key`. Stamps live in the database, so a bump reaches
+    every worker whatever the cache backend; each worker re-reads a stamp
+    at most every CACHE_VERSION_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    known = _versions.get(key)
+    if known and now - known[1] < getattr(settings, 'CACHE_VERSION_CHECK_INTERVAL', 2):
+        return known[0]
+    version = version_table().filter(key=key).values_list('version', flat=True).first()
+    if version is None:
+        version = version_table().get_or_create(key=key, defaults={'version': uuid.uuid4().hex})[0].version
+    _versions[key] = (version, now)
+    return version
+
+
+def bump_version(key):
+    """
+    Give `key` a new random stamp and return it. Random rather than
+    incremented, so a stamp is never reused after a rollback or reset.
+    """
+    version = uuid.uuid4().hex
+    version_table().update_or_create(key=key, defaults={'version': version})
+    _versions[key] = (version, time.monotonic())
+    return version
+
+
+def group_version_key(group):
+    return f'view_cache:{group}:version'
+
+
+def invalidate(*groups):
+    """Drop every cached response of the given groups"""
+    for group in groups:
+        bump_version(group_version_key(group))
+
+
+def single_flight(key, compute, timeout, lock_timeout=10, wait=5.0):
+    """
+    cache.get(key), computing the value on a miss. Only the caller that wins
+    cache.add() on the lock key recomputes; concurrent callers poll for the
+    result for up to `wait` seconds before computing it themselves.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=lock_timeout):
+        deadline = time.monotonic() + wait
+        delay = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            delay = min(delay * 2, 0.2)
+
+    try:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def cached_view(group, timeout=60):
+    """
+    Cache successful GET responses of a JSON view per full path (query string
+    included) until `timeout` expires or invalidate(group) is called.
+    Misses are recomputed through single_flight, so a burst of requests for
+    a cold key runs the view once.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or not getattr(settings, 'VIEW_CACHE_ENABLED', True):
+                return view(request, *args, **kwargs)
+
+            path_hash = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+            version = get_version(group_version_key(group))
+            key = f'view_cache:{group}:{version}:{path_hash}'
+            uncached = []
+
+            def compute():
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    uncached.append(response)
+                    return None
+                return (response.content, response['Content-Type'])
+
+            cached = single_flight(key, compute, timeout)
+            if uncached:
+                return uncached[0]
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        return wrapper
+    return decorator
+
+
+class LocalValue:
+    """
+    A single value memoized in process memory, tied to the shared version
+    under `version_key`, so bump_version() reaches every worker within
+    CACHE_VERSION_CHECK_INTERVAL seconds. The value is also reloaded once
+    it is older than the `max_age_setting` seconds.
+    """
+
+    def __init__(self, version_key, load, max_age_setting, default_max_age=60):
+        self.version_key = version_key
+        self.load = load
+        self.max_age_setting = max_age_setting
+        self.default_max_age = default_max_age
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._value = None
+        self._version = None
+        self._loaded_at = 0
+
+    def get(self):
+        max_age = getattr(settings, self.max_age_setting, self.default_max_age)
+        if self._value is not None and time.monotonic() - self._loaded_at < max_age:
+            if get_version(self.version_key) == self._version:
+                return self._value
+
+        with self._lock:
+            version = get_version(self.version_key)
+            value = self.load()
+            self._value, self._version = value, version
+            self._loaded_at = time.monotonic()
+        return value
+
+    def invalidate(self):
+        self.clear()
+        bump_version(self.version_key)
@@ -1,7 +1,40 @@
+from django.utils import translation
+from django.utils.functional import SimpleLazyObject
+import threading
+
 from .custom_admin import satly_admin_site
 
+
+# (language, registry, permissions) -> app list. The lists only depend on what
+# the user may see, so staff with the same permissions share one entry.
+_app_lists = {}
+_app_lists_lock = threading.Lock()
+MAX_APP_LISTS = 256
+
+
+def app_list_key(user):
+    registry = tuple(sorted(model._meta.label for model in satly_admin_site._registry))
+    if user.is_superuser:
+        permissions = 'superuser'
+    else:
+        permissions = hash(frozenset(user.get_all_permissions()))
+    return (translation.get_language(), hash(registry), permissions)
+
+
+def cached_app_list(request):
+    key = app_list_key(request.user)
+    app_list = _app_lists.get(key)
+    if app_list is None:
+        app_list = satly_admin_site.get_app_list(request)
+        with _app_lists_lock:
+            if len(_app_lists) >= MAX_APP_LISTS:
+                _app_lists.clear()
+            _app_lists[key] = app_list
+    return app_list
+
+
 def admin_models(request):
     if request.user.is_authenticated and request.user.is_staff:
-        app_list = satly_admin_site.get_app_list(request)
-        return {'admin_app_list': app_list}
+        # Only built when a template actually iterates admin_app_list
+        return {'admin_app_list': SimpleLazyObject(lambda: cached_app_list(request))}
     return {'admin_app_list': []}
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.db.models import F
+import bisect
+import threading
+import time
+
+from .caching import bump_version, get_version
+from .models import ScoreBucket
+
+
+VERSION_KEY = 'score_distribution:version'
+
+SESSION_FIELDS = {
+    'total': 'total_score',
+    'english': 'english_score',
+    'math': 'math_score',
+}
+
+
+class ScoreDistribution:
+    """
+    The ScoreBucket histograms in process memory as sorted scores with
+    cumulative counts, so a percentile is one bisect. This worker's own
+    completions are added in place; everyone else's arrive with a reload,
+    at most SCORE_DISTRIBUTION_MAX_AGE seconds apart. A reload reads one
+    row per distinct score, not per exam. invalidate() makes every worker
+    reload at once, for bulk changes such as a backfill.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._version = None
+        self._loaded_at = 0
+
+    def _sync(self):
+        max_age = getattr(settings, 'SCORE_DISTRIBUTION_MAX_AGE', 60)
+        fresh = time.monotonic() - self._loaded_at < max_age
+        version = get_version(VERSION_KEY)
+        if fresh and version == self._version:
+            return
+        with self._lock:
+            histograms = {metric: ([], []) for metric in SESSION_FIELDS}
+            for metric, score, count in ScoreBucket.objects.filter(count__gt=0).values_list('metric', 'score', 'count'):
+                scores, cumulative = histograms[metric]
+                scores.append(score)
+                cumulative.append((cumulative[-1] if cumulative else 0) + count)
+            self._histograms = histograms
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def percentile(self, metric, score):
+        """
+        Share of completed exams scoring at or below `score`, as a whole
+        number between 1 and 99, or None while there is no data.
+        """
+        self._sync()
+        scores, cumulative = self._histograms.get(metric, ([], []))
+        if not cumulative:
+            return None
+        index = bisect.bisect_right(scores, score)
+        at_or_below = cumulative[index - 1] if index else 0
+        return min(max(round(at_or_below / cumulative[-1] * 100), 1), 99)
+
+    def record(self, session):
+        """Count a completed session's scores into ScoreBucket (call inside its transaction)"""
+        for metric, field in SESSION_FIELDS.items():
+            score = getattr(session, field)
+            buckets = ScoreBucket.objects.filter(metric=metric, score=score)
+            if not buckets.update(count=F('count') + 1):
+                ScoreBucket.objects.bulk_create([ScoreBucket(metric=metric, score=score)], ignore_conflicts=True)
+                buckets.update(count=F('count') + 1)
+
+    def add(self, session):
+        """Apply a recorded session to this worker's copy; run after its transaction commits"""
+        with self._lock:
+            for metric, field in SESSION_FIELDS.items():
+                scores, cumulative = self._histograms.get(metric, ([], []))
+                score = getattr(session, field)
+                index = bisect.bisect_left(scores, score)
+                if index == len(scores) or scores[index] != score:
+                    scores.insert(index, score)
+                    cumulative.insert(index, cumulative[index - 1] if index else 0)
+                for position in range(index, len(cumulative)):
+                    cumulative[position] += 1
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = 0
+
+    def invalidate(self):
+        """Reload everywhere"""
+        self.clear()
+        bump_version(VERSION_KEY)
+
+
+distribution = ScoreDistribution()
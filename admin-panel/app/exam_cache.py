@@ -0,0 +1,170 @@
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import json
+import threading
+import time
+
+from .caching import bump_version, get_version
+from .models import Question
+
+
+VERSION_KEY = 'exam_cache:questions_version'
+
+QUESTION_PAYLOAD_FIELDS = ('id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d')
+
+
+def questions_version():
+    """Shared version stamp of the question bank, bumped on every edit"""
+    return get_version(VERSION_KEY)
+
+
+def bump_questions_version():
+    bump_version(VERSION_KEY)
+
+
+def max_age():
+    return getattr(settings, 'EXAM_CACHE_MAX_AGE', 300)
+
+
+class ModuleCache(ABC):
+    """
+    Process-local values per (category, module) of the question bank.
+    Values are also stored in the shared cache so other workers can warm up
+    without querying. Every entry is tied to the questions version, which is
+    re-checked at most every EXAM_CACHE_CHECK_INTERVAL seconds, so lookups
+    are plain dictionary reads. Entries are dropped after EXAM_CACHE_MAX_AGE
+    seconds whatever the version says.
+    """
+    name = None
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0
+        self._reset_at = 0
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def load(self, category, module):
+        """The value for one module, read from the database"""
+
+    def _sync_version(self):
+        now = time.monotonic()
+        interval = getattr(settings, 'EXAM_CACHE_CHECK_INTERVAL', 5)
+        if self._version is not None and now - self._checked_at < interval:
+            return
+        version = questions_version()
+        with self._lock:
+            if version != self._version or now - self._reset_at > max_age():
+                self._values = {}
+                self._version = version
+                self._reset_at = now
+            self._checked_at = now
+
+    def get(self, category, module):
+        self._sync_version()
+        key = (category, int(module))
+        value = self._values.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        shared_key = f'exam_cache:{self.name}:{category}:{module}:{self._version}'
+        value = cache.get(shared_key)
+        if value is None:
+            value = self.load(category, int(module))
+            if self.is_empty(value):
+                # Not provisioned yet; look again next time rather than
+                # waiting for an invalidation from another process
+                return value
+            cache.set(shared_key, value, timeout=max_age())
+        with self._lock:
+            self._values[key] = value
+        return value
+
+    def is_empty(self, value):
+        return not value
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+            self._checked_at = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+            'modules_cached': len(self._values),
+            'version': self._version,
+        }
+
+
+class AnswerKeyCache(ModuleCache):
+    """{question_id: correct_answer} per module, used to grade answers"""
+    name = 'answer_key'
+
+    def __init__(self):
+        super().__init__()
+        self.fallbacks = 0
+
+    def load(self, category, module):
+        return dict(Question.objects.filter(
+            category=category, module=module
+        ).values_list('id', 'correct_answer'))
+
+    def correct_answers(self, category, module, question_ids):
+        """
+        {question_id: correct_answer} for the given ids, served from the
+        module's answer key. Ids from other modules fall back to one query.
+        """
+        answer_key = self.get(category, module)
+        found = {qid: answer_key[qid] for qid in question_ids if qid in answer_key}
+        missing = [qid for qid in question_ids if qid not in answer_key]
+        if missing:
+            self.fallbacks += 1
+            found.update(Question.objects.filter(id__in=missing).values_list('id', 'correct_answer'))
+        return found
+
+    def stats(self):
+        stats = super().stats()
+        stats['fallback_queries'] = self.fallbacks
+        return stats
+
+
+class ModulePayloadCache(ModuleCache):
+    """
+    Pre-encoded question JSON per module as served to the exam page, with
+    the question ids in order and an ETag derived from the content.
+    """
+    name = 'payload'
+
+    def load(self, category, module):
+        questions = list(Question.objects.filter(
+            category=category, module=module
+        ).order_by('question_number').values(*QUESTION_PAYLOAD_FIELDS))
+        payload = json.dumps(questions)
+        return {
+            'json': payload,
+            'ids': [q['id'] for q in questions],
+            'etag': hashlib.sha1(payload.encode()).hexdigest()[:16],
+        }
+
+    def is_empty(self, value):
+        return not value['ids']
+
+
+answer_keys = AnswerKeyCache()
+module_payloads = ModulePayloadCache()
+
+
+def invalidate_questions():
+    answer_keys.clear()
+    module_payloads.clear()
+    bump_questions_version()
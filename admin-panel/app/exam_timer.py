@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .models import ExamSession
+
+
+MODULE_DURATIONS = {
+    'english': 32 * 60,
+    'math': 35 * 60,
+}
+
+TIMER_FIELDS = ['module_started_at', 'module_deadline']
+
+
+def grace_seconds():
+    """Allowance for network latency before a module counts as expired"""
+    return getattr(settings, 'EXAM_DEADLINE_GRACE_SECONDS', 30)
+
+
+def timer_key(session_id, section, module):
+    # Per module: a worker that missed the move to the next module has no
+    # entry for it, rather than a stale one for the previous module
+    return f'exam_timer:{session_id}:{section}:{module}'
+
+
+def cache_timer(session):
+    """
+    Keep what a heartbeat needs in the cache so heartbeats skip the database.
+    Only a running clock is cached; its deadline never changes.
+    """
+    timer = {
+        'user_id': session.user_id,
+        'section': session.current_section,
+        'module': session.current_module,
+        'deadline': session.module_deadline.timestamp() if session.module_deadline else None,
+    }
+    if session.module_deadline:
+        cache.set(
+            timer_key(session.id, session.current_section, session.current_module), timer,
+            timeout=MODULE_DURATIONS[session.current_section] + 3600
+        )
+    return timer
+
+
+def get_timer(session_id, section=None, module=None):
+    """
+    The timer of the module the exam page shows, from the cache. On a miss,
+    or when the page doesn't say which module it shows, the session row
+    decides, so the answer may name a different module.
+    """
+    if section in MODULE_DURATIONS and module is not None:
+        timer = cache.get(timer_key(session_id, section, module))
+        if timer is not None:
+            return timer
+    session = ExamSession.objects.filter(id=session_id).only(
+        'user_id', 'current_section', 'current_module', 'module_deadline'
+    ).first()
+    if session is None:
+        return None
+    return cache_timer(session)
+
+
+def start_module(session, now=None):
+    """Start the clock of the current module unless it is already running; returns True if started"""
+    if session.module_deadline:
+        return False
+    now = now or timezone.now()
+    session.module_started_at = now
+    session.module_deadline = now + timedelta(seconds=MODULE_DURATIONS[session.current_section])
+    session.save(update_fields=TIMER_FIELDS)
+    cache_timer(session)
+    return True
+
+
+def end_module(session, now=None):
+    """
+    Stop the module clock and add the time used (capped at the deadline) to
+    time_spent. The caller saves TIMER_FIELDS and time_spent.
+    """
+    now = now or timezone.now()
+    if session.module_started_at:
+        end = min(now, session.module_deadline) if session.module_deadline else now
+        session.time_spent += max(int((end - session.module_started_at).total_seconds()), 0)
+    cache.delete(timer_key(session.id, session.current_section, session.current_module))
+    session.module_started_at = None
+    session.module_deadline = None
+
+
+def remaining(deadline, now=None):
+    """Whole seconds left until `deadline` (a datetime or a timestamp)"""
+    if deadline is None:
+        return None
+    if not isinstance(deadline, datetime):
+        deadline = datetime.fromtimestamp(deadline, tz=dt_timezone.utc)
+    return max(int((deadline - (now or timezone.now())).total_seconds()), 0)
+
+
+def is_expired(deadline, now=None):
+    if deadline is None:
+        return False
+    if not isinstance(deadline, datetime):
+        deadline = datetime.fromtimestamp(deadline, tz=dt_timezone.utc)
+    return (now or timezone.now()) > deadline + timedelta(seconds=grace_seconds())
+
+
+def heartbeat(session_id, now=None):
+    """
+    Record that the exam page is alive. Only a cache write; last_heartbeat_at
+    is persisted at most every EXAM_HEARTBEAT_PERSIST_INTERVAL seconds per
+    session, via a cache.add() guard.
+    """
+    now = now or timezone.now()
+    interval = getattr(settings, 'EXAM_HEARTBEAT_PERSIST_INTERVAL', 300)
+    cache.set(f'exam_presence:{session_id}', now.timestamp(), timeout=interval * 2)
+    if cache.add(f'exam_heartbeat_persisted:{session_id}', 1, timeout=interval):
+        ExamSession.objects.filter(id=session_id).update(last_heartbeat_at=now)
@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+import bisect
+import threading
+import time
+
+from .caching import bump_version, get_version
+from .models import ExamSession, User
+
+
+VERSION_KEY = 'leaderboard:version'
+
+SYNC_OVERLAP_SECONDS = 60
+
+
+class Leaderboard:
+    """
+    Ranked users (best_score > 0) kept in process memory as a list of
+    (-best_score, user_id) sorted ascending, i.e. best first, plus a
+    user_id -> score map. Rank, percentile and neighbor lookups are a
+    bisect away. The list is built once from users_ranked_score_idx. After
+    that, every LEADERBOARD_CHECK_INTERVAL seconds each worker applies the
+    exams completed since its last check (all workers' alike) in place.
+    Only invalidate(), for changes that aren't an exam result such as a
+    deleted user, makes every worker rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._scores = {}
+        self._version = None
+        self._checked_at = 0
+        self._synced_at = None
+
+    def _sync(self):
+        now = time.monotonic()
+        interval = getattr(settings, 'LEADERBOARD_CHECK_INTERVAL', 5)
+        if self._entries is not None and now - self._checked_at < interval:
+            return
+        version = get_version(VERSION_KEY)
+        with self._lock:
+            synced_at = timezone.now()
+            if version != self._version:
+                rows = User.objects.filter(best_score__gt=0).order_by('-best_score', 'id').values_list('id', 'best_score')
+                self._entries = [(-score, user_id) for user_id, score in rows]
+                self._scores = {user_id: score for user_id, score in rows}
+                self._version = version
+            else:
+                # completed_at is set before commit, so look back a little;
+                # applying a result twice changes nothing
+                since = self._synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+                for user_id, score in ExamSession.objects.filter(
+                    status='completed', completed_at__gte=since
+                ).values_list('user_id', 'total_score'):
+                    self._apply(user_id, score)
+            self._synced_at = synced_at
+            self._checked_at = now
+
+    def _apply(self, user_id, score):
+        previous = self._scores.get(user_id, 0)
+        if score <= previous:
+            return False
+        if previous:
+            del self._entries[bisect.bisect_left(self._entries, (-previous, user_id))]
+        bisect.insort(self._entries, (-score, user_id))
+        self._scores[user_id] = score
+        return True
+
+    def clear(self):
+        """Force a rebuild on next use"""
+        with self._lock:
+            self._version = None
+            self._checked_at = 0
+
+    def invalidate(self):
+        """Rebuild from the database everywhere, e.g. after users were removed"""
+        self.clear()
+        bump_version(VERSION_KEY)
+
+    def record_score(self, user_id, score):
+        """
+        Apply a finished exam in this worker right away; only an improvement
+        on the best score moves the user. Other workers pick it up on their
+        next sync.
+        """
+        self._sync()
+        with self._lock:
+            return self._apply(user_id, score)
+
+    def top(self, limit):
+        """[(user_id, score)] of the best `limit` users"""
+        self._sync()
+        with self._lock:
+            return [(user_id, -key) for key, user_id in self._entries[:limit]]
+
+    def size(self):
+        self._sync()
+        return len(self._entries)
+
+    def position(self, user_id):
+        """
+        {'rank', 'score', 'percentile', 'total'} for a ranked user, or None.
+        Tied scores share a rank; percentile is the share of ranked users
+        with a strictly lower score.
+        """
+        self._sync()
+        with self._lock:
+            score = self._scores.get(user_id)
+            if not score:
+                return None
+            total = len(self._entries)
+            higher = bisect.bisect_left(self._entries, (-score,))
+            lower = total - bisect.bisect_right(self._entries, (-score, float('inf')))
+        return {
+            'rank': higher + 1,
+            'score': score,
+            'percentile': round(lower / total * 100, 1),
+            'total': total,
+        }
+
+    def neighbors(self, user_id, around=2):
+        """[(position, user_id, score)] of up to `around` users on each side, the user included"""
+        self._sync()
+        with self._lock:
+            score = self._scores.get(user_id)
+            if not score:
+                return []
+            index = bisect.bisect_left(self._entries, (-score, user_id))
+            start = max(index - around, 0)
+            return [
+                (start + offset + 1, entry_user_id, -key)
+                for offset, (key, entry_user_id) in enumerate(self._entries[start:index + around + 1])
+            ]
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from app.exam_cache import invalidate_questions
+from app.models import ExamAnswer, ExamSession, Question, User
+from app.views import save_exam_answers
+
+
+PROFILES = [
+    ('default', {}),
+    ('tuned', settings.SQLITE_TUNED_OPTIONS),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent answer-save throughput of plain and tuned SQLite '
+        'settings. Runs on scratch database files, never on the configured one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Students saving answers at once')
+        parser.add_argument('--readers', type=int, default=4, help='Threads reading answers meanwhile')
+        parser.add_argument('--saves', type=int, default=50, help='Answers saved per writer')
+        parser.add_argument('--questions', type=int, default=27, help='Questions in the module')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The configured database is not SQLite')
+        if min(options['writers'], options['saves'], options['questions']) < 1 or options['readers'] < 0:
+            raise CommandError('--writers, --saves and --questions must be positive, --readers not negative')
+
+        database = connection.settings_dict
+        original = dict(database)
+        directory = tempfile.mkdtemp(prefix='satly-bench-')
+        try:
+            for name, profile_options in PROFILES:
+                connection.close()
+                database.update(NAME=os.path.join(directory, f'{name}.sqlite3'), OPTIONS=dict(profile_options))
+                call_command('migrate', verbosity=0, interactive=False)
+                self.report(name, self.run(options))
+        finally:
+            connection.close()
+            database.clear()
+            database.update(original)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, options):
+        Question.objects.bulk_create([
+            Question(
+                category='english', module=1, question_number=number, question_text=f'Question {number}',
+                option_a='A', option_b='B', option_c='C', option_d='D', correct_answer='A',
+            )
+            for number in range(1, options['questions'] + 1)
+        ])
+        invalidate_questions()
+        question_ids = list(Question.objects.values_list('id', flat=True))
+        sessions = [
+            ExamSession.objects.create(user=User.objects.create(username=f'bench{number}'))
+            for number in range(options['writers'])
+        ]
+        connection.close()
+
+        latencies = []
+        counts = {'saves': 0, 'reads': 0, 'locked': 0}
+        lock = threading.Lock()
+        writing = threading.Event()
+        writing.set()
+        start = threading.Barrier(len(sessions) + options['readers'] + 1)
+
+        def write(session):
+            start.wait()
+            for _ in range(options['saves']):
+                began = time.perf_counter()
+                try:
+                    save_exam_answers(session, [(random.choice(question_ids), random.choice('ABCD'))])
+                except OperationalError:
+                    with lock:
+                        counts['locked'] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - began)
+                    counts['saves'] += 1
+            connection.close()
+
+        def read():
+            start.wait()
+            while writing.is_set():
+                try:
+                    ExamAnswer.objects.filter(exam_session=random.choice(sessions), is_correct=True).count()
+                except OperationalError:
+                    with lock:
+                        counts['locked'] += 1
+                    continue
+                with lock:
+                    counts['reads'] += 1
+            connection.close()
+
+        writers = [threading.Thread(target=write, args=(session,)) for session in sessions]
+        readers = [threading.Thread(target=read) for _ in range(options['readers'])]
+        for thread in writers + readers:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        writing.clear()
+        for thread in readers:
+            thread.join()
+
+        latencies.sort()
+        return dict(
+            counts,
+            elapsed=elapsed,
+            median=statistics.median(latencies) if latencies else 0,
+            p95=latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        )
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:>8}: {result['saves'] / result['elapsed']:8.1f} saves/s  "
+            f"{result['reads'] / result['elapsed']:8.1f} reads/s  "
+            f"median {result['median'] * 1000:6.1f} ms  p95 {result['p95'] * 1000:7.1f} ms  "
+            f"{result['locked']} \"database is locked\" errors"
+        )
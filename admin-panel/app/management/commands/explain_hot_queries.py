@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from datetime import timedelta
+import re
+
+from app.models import User, ExamSession, Payment, UserActivity
+
+
+def hot_queries():
+    """(name, queryset) for the access paths behind the dashboard, history and admin pages"""
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    return [
+        ('user exam history', ExamSession.objects.filter(
+            user_id=1, status='completed').order_by('-completed_at')[:10]),
+        ('unfinished exam lookup', ExamSession.objects.filter(user_id=1, status='in_progress')[:1]),
+        ('tests completed per day', ExamSession.objects.filter(
+            status='completed', completed_at__gte=week_ago, completed_at__lt=now).values('completed_at').order_by()),
+        ('signups per day', User.objects.filter(
+            is_staff=False, created_at__gte=week_ago, created_at__lt=now).values('created_at')),
+        ('last active per day', User.objects.filter(
+            is_staff=False, last_active__gte=week_ago, last_active__lt=now).values('last_active')),
+        ('activity per day', UserActivity.objects.filter(
+            first_seen__gte=week_ago, first_seen__lt=now).values('first_seen')),
+        ('admin users first page', User.objects.filter(is_staff=False).order_by('-created_at', '-id')[:50]),
+        ('top band scores', User.objects.filter(best_score__gt=0).order_by('-best_score')[:10]),
+        ('payment totals', Payment.objects.filter(status='completed').values('payment_type', 'amount').order_by()),
+        ('payment ledger first page', Payment.objects.order_by('-created_at', '-id')[:50]),
+    ]
+
+
+def full_scans(plan):
+    """Tables read without any index according to an EXPLAIN plan"""
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    # SQLite: "SCAN users" is a table scan, "SCAN users USING INDEX ..." is not
+    return re.findall(r'SCAN (\w+)\s*$', plan, re.MULTILINE)
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot queries and fail if any of them needs a full table scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables are cheaper to scan; check that an index *can* be used
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in hot_queries():
+                plan = queryset.explain()
+                scans = full_scans(plan)
+                if options['show_plans']:
+                    self.stdout.write(f'-- {name}\n{plan}\n')
+                if scans:
+                    failures.append(f"{name}: full scan of {', '.join(scans)}")
+                    self.stdout.write(self.style.ERROR(f'FAIL  {name}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'ok    {name}'))
+
+        if failures:
+            raise CommandError('Queries without a supporting index:\n' + '\n'.join(failures))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from app.media_store import DATA_URL_RE, externalize_images
+from app.models import Test
+
+
+class Command(BaseCommand):
+    help = (
+        'Move inline base64 question images out of Test.test_questions into '
+        'MEDIA_ROOT. Safe to run repeatedly; tests without inline images are untouched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would move without writing anything')
+
+    def handle(self, *args, **options):
+        tests = images = skipped = 0
+        for test in Test.objects.only('id', 'test_questions').iterator(chunk_size=50):
+            if options['dry_run']:
+                moved = sum(1 for question in test.test_questions or [] if self.is_inline(question))
+            else:
+                try:
+                    questions, moved = externalize_images(test.test_questions)
+                except ValueError as error:
+                    # Unreadable image data stays inline
+                    self.stderr.write(f'Test {test.pk}: {error}, left unchanged')
+                    skipped += 1
+                    continue
+                if moved:
+                    test.test_questions = questions
+                    test.save(update_fields=['test_questions'])
+            if moved:
+                tests += 1
+                images += moved
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {images} image(s) from {tests} test(s)'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'{skipped} test(s) had unreadable images'))
+
+    def is_inline(self, question):
+        return isinstance(question, dict) and isinstance(question.get('image'), str) and bool(DATA_URL_RE.match(question['image']))
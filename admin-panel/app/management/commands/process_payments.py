@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+import time
+
+from app.models import Payment
+from app import payments
+
+
+class Command(BaseCommand):
+    help = 'Process pending payments (worker for PAYMENT_PROCESSING = "command")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the current backlog and exit')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait between polls')
+        parser.add_argument('--stale-after', type=int, default=None,
+                            help='Minutes after which a payment stuck in processing is marked failed '
+                                 '(default: PAYMENT_STALE_MINUTES)')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = self.process_backlog(options['stale_after'])
+            if processed:
+                self.stdout.write(f'Processed {processed} payment(s)')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+    def process_backlog(self, stale_after):
+        payments.fail_stale(stale_after)
+
+        processed = 0
+        pending = Payment.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:100]
+        for payment_id in pending:
+            if payments.process_payment(payment_id):
+                processed += 1
+        return processed
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+import random
+
+from app.models import Question
+from app.exam_cache import invalidate_questions
+
+
+MODULE_SIZES = {
+    'english': 27,
+    'math': 22,
+}
+
+
+def sample_questions(category, module):
+    return [
+        Question(
+            category=category,
+            module=module,
+            question_number=i,
+            question_text=f'Sample {category.title()} Question {i}: Which of the following best describes the main idea?',
+            option_a='The author argues for environmental protection',
+            option_b='The passage discusses historical events',
+            option_c="Technology's impact on society",
+            option_d='Economic development strategies',
+            correct_answer=random.choice(['A', 'B', 'C', 'D'])
+        )
+        for i in range(1, MODULE_SIZES[category] + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Fill missing exam modules with sample questions (existing questions are kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', choices=list(MODULE_SIZES), help='Only provision this section')
+        parser.add_argument('--module', type=int, choices=[1, 2], help='Only provision this module')
+
+    def handle(self, *args, **options):
+        categories = [options['category']] if options['category'] else list(MODULE_SIZES)
+        modules = [options['module']] if options['module'] else [1, 2]
+
+        created = 0
+        with transaction.atomic():
+            for category in categories:
+                for module in modules:
+                    before = Question.objects.filter(category=category, module=module).count()
+                    Question.objects.bulk_create(sample_questions(category, module), ignore_conflicts=True)
+                    added = Question.objects.filter(category=category, module=module).count() - before
+                    created += added
+                    self.stdout.write(f'{category.title()} module {module}: {added} question(s) added')
+
+        # bulk_create does not send post_save, so drop cached modules explicitly
+        transaction.on_commit(invalidate_questions)
+        self.stdout.write(self.style.SUCCESS(f'Provisioned {created} question(s)'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import date
+
+from app import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll up DailyStats from raw user and exam tables (run daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every day instead of rolling forward from the watermark')
+        parser.add_argument('--since', help='With --rebuild, first day to recompute (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['since'] and not options['rebuild']:
+            raise CommandError('--since can only be used together with --rebuild')
+
+        if options['rebuild']:
+            since = None
+            if options['since']:
+                try:
+                    since = date.fromisoformat(options['since'])
+                except ValueError:
+                    raise CommandError('--since must be a date in YYYY-MM-DD format')
+            days = rollups.rebuild(start=since)
+        else:
+            days = rollups.roll_forward()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {days} day(s), watermark is now {rollups.watermark() or "unset"}'
+        ))
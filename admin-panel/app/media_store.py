@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+import base64
+import binascii
+import hashlib
+import io
+import re
+
+
+# Pillow format -> file extension; anything else (SVG included) is rejected
+IMAGE_EXTENSIONS = {
+    'PNG': 'png',
+    'JPEG': 'jpg',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+DATA_URL_RE = re.compile(r'^data:image/[\w.+-]+;base64,(.*)$', re.DOTALL)
+
+
+def max_image_bytes():
+    return getattr(settings, 'QUESTION_IMAGE_MAX_BYTES', 5 * 1024 * 1024)
+
+
+def image_extension(content):
+    """File extension for image bytes, sniffed by Pillow rather than trusting the client"""
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+            image_format = image.format
+    except Exception:
+        raise ValueError("Not a valid image")
+    if image_format not in IMAGE_EXTENSIONS:
+        raise ValueError(f"Unsupported image type: {image_format}")
+    return IMAGE_EXTENSIONS[image_format]
+
+
+def store_image(content):
+    """
+    Save image bytes under MEDIA_ROOT named by their SHA-256, so the same
+    image uploaded twice is stored once. Returns the public URL.
+    """
+    if len(content) > max_image_bytes():
+        raise ValueError("Image is too large")
+    extension = image_extension(content)
+
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'question_images/{digest[:2]}/{digest}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return default_storage.url(name)
+
+
+def decode_data_url(value):
+    """The bytes of a base64 image data: URL, or None for anything else"""
+    match = DATA_URL_RE.match(value) if isinstance(value, str) else None
+    if not match:
+        return None
+    try:
+        return base64.b64decode(match.group(1), validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid image data")
+
+
+def externalize_images(questions):
+    """
+    Replace inline data: URL images in a test's question list with stored
+    file URLs. Returns (questions, number of images moved).
+    """
+    moved = 0
+    result = []
+    for question in questions or []:
+        content = decode_data_url(question.get('image')) if isinstance(question, dict) else None
+        if content:
+            question = dict(question, image=store_image(content))
+            moved += 1
+        result.append(question)
+    return result, moved
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .buffers import activity_log
+from .replicas import PIN_COOKIE, REPLICA_ALIAS
+
+
+class ActivityMiddleware:
+    """
+    Records authenticated activity at most once per ACTIVITY_THROTTLE_SECONDS
+    per user. The throttle is a cache.add() on a per-user, per-day key, so the
+    first request of every day is always recorded and repeat requests cost a
+    single cache round trip. Database writes are batched by activity_log.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            self.touch(user.pk)
+        return response
+
+    def touch(self, user_id):
+        now = timezone.now()
+        key = f'activity:{user_id}:{timezone.localdate(now).isoformat()}'
+        if cache.add(key, 1, timeout=getattr(settings, 'ACTIVITY_THROTTLE_SECONDS', 300)):
+            activity_log.record(user_id, now)
+
+
+class ReplicaPinMiddleware:
+    """
+    Sets replicas.PIN_COOKIE for REPLICA_PIN_SECONDS after a staff member
+    changes something, so the analytics they open next are read from the
+    primary and already show the change despite replication lag.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if REPLICA_ALIAS in settings.DATABASES and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                    httponly=True, samesite='Lax'
+                )
+        return response
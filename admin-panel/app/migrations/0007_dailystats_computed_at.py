@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_pricingsettings_payment_payment_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystats',
+            name='computed_at',
+            field=models.DateTimeField(blank=True, help_text='Set once the day has been rolled up from raw tables', null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill_running_scores(apps, schema_editor):
+    """Module scores are now counted as answers arrive; seed them for unfinished sessions"""
+    ExamSession = apps.get_model('app', 'ExamSession')
+    ExamAnswer = apps.get_model('app', 'ExamAnswer')
+
+    unfinished = ExamSession.objects.filter(status__in=['in_progress', 'break'])
+    for session in unfinished.iterator():
+        correct = ExamAnswer.objects.filter(exam_session=session, is_correct=True).aggregate(
+            english_module1_score=Count('id', filter=Q(question__category='english', question__module=1)),
+            english_module2_score=Count('id', filter=Q(question__category='english', question__module=2)),
+            math_module1_score=Count('id', filter=Q(question__category='math', question__module=1)),
+            math_module2_score=Count('id', filter=Q(question__category='math', question__module=2)),
+        )
+        ExamSession.objects.filter(pk=session.pk).update(**correct)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_dailystats_computed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_running_scores, migrations.RunPython.noop),
+    ]
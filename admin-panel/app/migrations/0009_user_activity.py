@@ -0,0 +1,48 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_activity(apps, schema_editor):
+    """The only history available is each user's last seen day"""
+    User = apps.get_model('app', 'User')
+    UserActivity = apps.get_model('app', 'UserActivity')
+    rows = [
+        UserActivity(user_id=user_id, date=timezone.localtime(last_active).date(), first_seen=last_active)
+        for user_id, last_active in User.objects.filter(last_active__isnull=False).values_list('id', 'last_active').iterator()
+    ]
+    UserActivity.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_backfill_running_module_scores'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='last_active',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Updated by ActivityMiddleware, throttled'),
+        ),
+        migrations.CreateModel(
+            name='UserActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('first_seen', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'user_activity',
+                'indexes': [models.Index(fields=['first_seen'], name='user_activity_first_seen_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_user_activity_per_day')],
+            },
+        ),
+        migrations.RunPython(seed_activity, migrations.RunPython.noop),
+    ]
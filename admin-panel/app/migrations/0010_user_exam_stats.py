@@ -0,0 +1,66 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_exam_stats(apps, schema_editor):
+    ExamSession = apps.get_model('app', 'ExamSession')
+    UserExamStats = apps.get_model('app', 'UserExamStats')
+
+    completed = ExamSession.objects.filter(status='completed')
+    totals = completed.values('user_id').annotate(
+        exams_completed=Count('id'),
+        total_time_spent=Sum('time_spent'),
+        score_sum=Sum('total_score'),
+        best_score=Max('total_score'),
+    )
+    rows = []
+    for row in totals.iterator():
+        recent = list(completed.filter(user_id=row['user_id']).order_by('-completed_at')[:10])
+        rows.append(UserExamStats(
+            user_id=row['user_id'],
+            exams_completed=row['exams_completed'],
+            total_time_spent=row['total_time_spent'] or 0,
+            score_sum=row['score_sum'] or 0,
+            best_score=row['best_score'] or 0,
+            last_score=recent[0].total_score,
+            last_completed_at=recent[0].completed_at,
+            recent_scores=[{
+                'id': session.id,
+                'completed_at': session.completed_at.isoformat() if session.completed_at else None,
+                'total': session.total_score,
+                'english': session.english_score,
+                'math': session.math_score,
+            } for session in recent],
+        ))
+    UserExamStats.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_user_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserExamStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='exam_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('exams_completed', models.IntegerField(default=0)),
+                ('total_time_spent', models.IntegerField(default=0, help_text='Time spent in seconds')),
+                ('score_sum', models.IntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+                ('last_score', models.IntegerField(default=0)),
+                ('last_completed_at', models.DateTimeField(blank=True, null=True)),
+                ('recent_scores', models.JSONField(default=list, help_text='Latest completed exams, newest first')),
+            ],
+            options={
+                'db_table': 'user_exam_stats',
+            },
+        ),
+        migrations.RunPython(backfill_exam_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_buckets(apps, schema_editor):
+    ExamSession = apps.get_model('app', 'ExamSession')
+    ScoreBucket = apps.get_model('app', 'ScoreBucket')
+
+    completed = ExamSession.objects.filter(status='completed')
+    rows = []
+    for metric, field in (('total', 'total_score'), ('english', 'english_score'), ('math', 'math_score')):
+        for row in completed.values(field).annotate(n=Count('id')).order_by():
+            rows.append(ScoreBucket(metric=metric, score=row[field], count=row['n']))
+    ScoreBucket.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('total', 'Total'), ('english', 'English'), ('math', 'Math')], max_length=10)),
+                ('score', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'score_buckets',
+                'ordering': ['metric', 'score'],
+                'unique_together': {('metric', 'score')},
+            },
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_score_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='last_heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='module_deadline',
+            field=models.DateTimeField(blank=True, help_text="When the current module's time runs out", null=True),
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='module_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-18 00:17
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_processing_started_at(apps, schema_editor):
+    # Charges already in flight have no start time; the stale check falls back to creation time for them
+    Payment = apps.get_model('app', 'Payment')
+    Payment.objects.filter(status='processing').update(processing_started_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_cache_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Reversing drops the column, so there is nothing to undo
+        migrations.RunPython(backfill_processing_started_at, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 import uuid
 
+from .caching import LocalValue
+
 
 class User(AbstractUser):
     SUBSCRIPTION_CHOICES = [
@@ -44,10 +46,17 @@ class User(AbstractUser):
     tests_completed = models.IntegerField(default=0)
     total_time_spent = models.IntegerField(default=0, help_text="Total time spent in minutes")
     created_at = models.DateTimeField(default=timezone.now)
-    last_active = models.DateTimeField(auto_now=True)
+    last_active = models.DateTimeField(default=timezone.now, help_text="Updated by ActivityMiddleware, throttled")
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            # Partial on students: Django renders is_staff=False as NOT is_staff,
+            # which can match an index condition but not an equality column
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_staff=False), name='users_student_created_idx'),
+            models.Index(fields=['last_active'], condition=models.Q(is_staff=False), name='users_student_active_idx'),
+            models.Index(fields=['-best_score'], condition=models.Q(best_score__gt=0), name='users_ranked_score_idx'),
+        ]
     
     def __str__(self):
         return self.email or self.username
@@ -108,10 +117,22 @@ class ExamSession(models.Model):
     time_spent = models.IntegerField(default=0, help_text="Time spent in seconds")
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+    module_started_at = models.DateTimeField(blank=True, null=True)
+    module_deadline = models.DateTimeField(blank=True, null=True, help_text="When the current module's time runs out")
+    last_heartbeat_at = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         db_table = 'exam_sessions'
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['user', 'status', '-completed_at'], name='exam_user_status_done_idx'),
+            models.Index(fields=['completed_at'], condition=models.Q(status='completed'), name='exam_completed_at_idx'),
+        ]
+    
+    @property
+    def module_score_field(self):
+        """Field holding the running correct-answer count of the current module"""
+        return f'{self.current_section}_module{self.current_module}_score'
     
     def save(self, *args, **kwargs):
         if not self.certificate_id and self.status == 'completed':
@@ -122,6 +143,54 @@ class ExamSession(models.Model):
         return f"{self.user.username} - {self.started_at.strftime('%Y-%m-%d')}"
 
 
+class UserExamStats(models.Model):
+    """Denormalized exam history per user, updated as each exam completes"""
+    RECENT_LIMIT = 10
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='exam_stats')
+    exams_completed = models.IntegerField(default=0)
+    total_time_spent = models.IntegerField(default=0, help_text="Time spent in seconds")
+    score_sum = models.IntegerField(default=0)
+    best_score = models.IntegerField(default=0)
+    last_score = models.IntegerField(default=0)
+    last_completed_at = models.DateTimeField(blank=True, null=True)
+    recent_scores = models.JSONField(default=list, help_text="Latest completed exams, newest first")
+    
+    class Meta:
+        db_table = 'user_exam_stats'
+    
+    def __str__(self):
+        return f"Exam stats for {self.user_id}"
+    
+    @property
+    def avg_score(self):
+        return round(self.score_sum / self.exams_completed) if self.exams_completed else 0
+    
+    @staticmethod
+    def score_point(session):
+        return {
+            'id': session.id,
+            'completed_at': session.completed_at.isoformat(),
+            'total': session.total_score,
+            'english': session.english_score,
+            'math': session.math_score,
+        }
+    
+    @classmethod
+    def record(cls, session):
+        """Fold a just-completed session into its user's stats (call inside a transaction)"""
+        stats, created = cls.objects.select_for_update().get_or_create(user_id=session.user_id)
+        stats.exams_completed += 1
+        stats.total_time_spent += session.time_spent
+        stats.score_sum += session.total_score
+        stats.best_score = max(stats.best_score, session.total_score)
+        stats.last_score = session.total_score
+        stats.last_completed_at = session.completed_at
+        stats.recent_scores = [cls.score_point(session)] + stats.recent_scores[:cls.RECENT_LIMIT - 1]
+        stats.save()
+        return stats
+
+
 class ExamAnswer(models.Model):
     exam_session = models.ForeignKey(ExamSession, on_delete=models.CASCADE, related_name='answers')
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
@@ -197,6 +266,7 @@ class DailyStats(models.Model):
     active_users = models.IntegerField(default=0)
     new_signups = models.IntegerField(default=0)
     tests_completed = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(blank=True, null=True, help_text="Set once the day has been rolled up from raw tables")
     
     class Meta:
         db_table = 'daily_stats'
@@ -206,6 +276,46 @@ class DailyStats(models.Model):
         return f"Stats for {self.date}"
 
 
+class UserActivity(models.Model):
+    """One row per user per day they were active, so historical DAU is exact"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity')
+    date = models.DateField()
+    first_seen = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'user_activity'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_user_activity_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['first_seen'], name='user_activity_first_seen_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} active on {self.date}"
+
+
+class ScoreBucket(models.Model):
+    """Number of completed exams per exact score, per score kind"""
+    METRIC_CHOICES = [
+        ('total', 'Total'),
+        ('english', 'English'),
+        ('math', 'Math'),
+    ]
+    
+    metric = models.CharField(max_length=10, choices=METRIC_CHOICES)
+    score = models.IntegerField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'score_buckets'
+        ordering = ['metric', 'score']
+        unique_together = ['metric', 'score']
+    
+    def __str__(self):
+        return f"{self.metric} {self.score}: {self.count}"
+
+
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('uzcard', 'Uzcard/Humo'),
@@ -230,10 +340,16 @@ class Payment(models.Model):
     payment_type = models.CharField(max_length=20, choices=[('exam', 'Exam'), ('subscription', 'Subscription')], default='exam')
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+    # When a worker claimed the payment and began the gateway charge
+    processing_started_at = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         db_table = 'payments'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'payment_type', 'amount'], name='payments_status_type_idx'),
+            models.Index(fields=['created_at', 'id'], name='payments_created_id_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.transaction_id:
@@ -256,6 +372,29 @@ class PricingSettings(models.Model):
         return f"Exam: {self.exam_price} so'm, Subscription: {self.subscription_price} so'm"
     
     @classmethod
-    def get_settings(cls):
+    def load(cls):
+        """The settings row from the database, for editing"""
         settings, created = cls.objects.get_or_create(id=1)
-        return settings
\ No newline at end of file
+        if created:
+            settings.refresh_from_db()
+        return settings
+    
+    @classmethod
+    def get_settings(cls):
+        """Current prices from process memory; treat the instance as read-only"""
+        return pricing_settings.get()
+
+
+pricing_settings = LocalValue('pricing_settings:version', PricingSettings.load, 'PRICING_CACHE_MAX_AGE')
+
+
+class CacheVersion(models.Model):
+    """Version stamps of the process-local caches (app.caching), shared by every worker"""
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.CharField(max_length=32)
+    
+    class Meta:
+        db_table = 'cache_versions'
+    
+    def __str__(self):
+        return f"{self.key} = {self.version}"
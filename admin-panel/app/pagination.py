@@ -0,0 +1,103 @@
+from django.db import connections
+from django.db.models import Q
+import base64
+import json
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+COUNT_CAP = 10000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        limit = int(value) if value else default
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a number")
+    return max(1, min(limit, maximum))
+
+
+def keyset_filter(fields, values):
+    """
+    Q selecting the rows that come after `values` when ordering by `fields`
+    descending, e.g. (created_at, id) -> created_at < c OR (created_at = c AND id < i).
+    """
+    condition = Q()
+    for i in range(len(fields) - 1, -1, -1):
+        step = Q(**{f'{fields[i]}__lt': values[i]})
+        equal = Q(**{fields[j]: values[j] for j in range(i)})
+        condition = (equal & step) | condition if i else step | condition
+    return condition
+
+
+def paginate(queryset, fields, cursor=None, limit=DEFAULT_LIMIT, to_python=None):
+    """
+    Keyset-paginate `queryset` ordered by `fields` descending. `to_python`
+    converts decoded cursor values back to field values (e.g. datetimes).
+    Returns (rows, next_cursor).
+    """
+    queryset = queryset.order_by(*[f'-{field}' for field in fields])
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(fields):
+            raise InvalidCursor("Invalid cursor")
+        if to_python:
+            try:
+                values = to_python(values)
+            except (TypeError, ValueError):
+                raise InvalidCursor("Invalid cursor")
+        queryset = queryset.filter(keyset_filter(fields, values))
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([
+        last[field] if isinstance(last, dict) else getattr(last, field) for field in fields
+    ])
+
+
+def estimate_count(queryset, cap=None):
+    """
+    Row count that never scans more than `cap` (COUNT_CAP) rows. Beyond the
+    cap the planner's estimate is used on PostgreSQL, otherwise the cap
+    itself. Returns (count, is_estimate).
+    """
+    if cap is None:
+        cap = COUNT_CAP
+    queryset = queryset.order_by()
+    count = queryset.values('pk')[:cap + 1].count()
+    if count <= cap:
+        return count, False
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]['Plan']['Plan Rows']), cap), True
+    return cap, True
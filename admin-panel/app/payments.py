@@ -0,0 +1,186 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from datetime import timedelta
+import logging
+import threading
+import time
+import uuid
+
+from .models import Payment
+
+
+logger = logging.getLogger(__name__)
+
+# pending -> processing -> completed / failed
+TRANSITIONS = {
+    'pending': ('processing', 'failed'),
+    'processing': ('completed', 'failed'),
+    'completed': (),
+    'failed': (),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class GatewayResult:
+    def __init__(self, success, reference=None, error=None):
+        self.success = success
+        self.reference = reference
+        self.error = error
+
+
+class FakeGateway:
+    """
+    Offline stand-in for a card processor. Waits PAYMENT_GATEWAY_DELAY seconds
+    and declines cards whose last four digits are 0000.
+    """
+    DECLINED_CARD_SUFFIX = '0000'
+
+    def charge(self, payment):
+        time.sleep(getattr(settings, 'PAYMENT_GATEWAY_DELAY', 2))
+        if payment.card_number == self.DECLINED_CARD_SUFFIX:
+            return GatewayResult(False, error='Card declined')
+        return GatewayResult(True, reference=uuid.uuid4().hex)
+
+
+def get_gateway():
+    return import_string(getattr(settings, 'PAYMENT_GATEWAY', 'app.payments.FakeGateway'))()
+
+
+def transition(payment_id, source, target, **fields):
+    """
+    Move a payment from `source` to `target` with a conditional UPDATE, so
+    concurrent workers can never both claim or finish the same payment.
+    Returns True if this call made the transition.
+    """
+    if target not in TRANSITIONS[source]:
+        raise ValueError(f"Invalid payment transition: {source} -> {target}")
+    return Payment.objects.filter(id=payment_id, status=source).update(status=target, **fields) == 1
+
+
+def process_payment(payment_id):
+    """Claim a pending payment, charge it and record the outcome"""
+    if not transition(payment_id, 'pending', 'processing', processing_started_at=timezone.now()):
+        return None
+
+    payment = Payment.objects.get(id=payment_id)
+    try:
+        result = get_gateway().charge(payment)
+    except Exception:
+        logger.exception("Payment gateway error for %s", payment.transaction_id)
+        result = GatewayResult(False, error='Gateway error')
+
+    status = 'completed' if result.success else 'failed'
+    if not transition(payment_id, 'processing', status, completed_at=timezone.now()):
+        # Marked failed as stale while the gateway was still answering
+        logger.error(
+            "Payment %s left processing before its charge finished; gateway result %s (%s) was not recorded",
+            payment.transaction_id, status, result.reference or result.error
+        )
+        return None
+    return status
+
+
+def stale_after(minutes=None):
+    if minutes is None:
+        minutes = getattr(settings, 'PAYMENT_STALE_MINUTES', 10)
+    return timedelta(minutes=minutes)
+
+
+def fail_stale(minutes=None):
+    """Fail payments whose charge started more than `minutes` (PAYMENT_STALE_MINUTES) ago and never finished"""
+    now = timezone.now()
+    stale = Payment.objects.filter(
+        status='processing', processing_started_at__lt=now - stale_after(minutes)
+    ).values_list('id', flat=True)
+    failed = 0
+    for payment_id in stale:
+        if transition(payment_id, 'processing', 'failed', completed_at=now):
+            logger.warning("Payment %s was stuck in processing and has been marked failed", payment_id)
+            failed += 1
+    return failed
+
+
+def _run(payment_id):
+    try:
+        process_payment(payment_id)
+    except Exception:
+        logger.exception("Payment %s could not be processed", payment_id)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PAYMENT_WORKERS', 2),
+                thread_name_prefix='payments'
+            )
+        return _executor
+
+
+def submit(payment):
+    """
+    Hand a pending payment to the background worker once the current
+    transaction commits. With PAYMENT_PROCESSING = 'command' the payment is
+    left for the `process_payments` management command instead.
+    """
+    if getattr(settings, 'PAYMENT_PROCESSING', 'thread') != 'thread':
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run, payment.id))
+
+
+def recover():
+    """
+    Pick up what a previous process left behind: fail charges that went
+    stale and queue every pending payment. Charges interrupted less than
+    PAYMENT_STALE_MINUTES ago are failed once they go stale.
+    """
+    fail_stale()
+    for payment_id in Payment.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+        get_executor().submit(_run, payment_id)
+
+    started = Payment.objects.filter(status='processing').aggregate(latest=Max('processing_started_at'))['latest']
+    if started:
+        delay = (started + stale_after() - timezone.now()).total_seconds()
+        timer = threading.Timer(max(delay, 0) + 1, _fail_stale_later)
+        timer.daemon = True
+        timer.start()
+
+
+def _recover():
+    try:
+        recover()
+    except Exception:
+        logger.exception("Payment recovery failed")
+    finally:
+        close_old_connections()
+
+
+def _fail_stale_later():
+    try:
+        fail_stale()
+    except Exception:
+        logger.exception("Failing stale payments failed")
+    finally:
+        close_old_connections()
+
+
+def recover_on_first_request(sender, **kwargs):
+    """Run recover() in the background once the process serves its first request"""
+    request_started.disconnect(recover_on_first_request)
+    get_executor().submit(_recover)
+
+
+def start():
+    """Called from AppConfig.ready(); the database isn't touched until the first request"""
+    if getattr(settings, 'PAYMENT_PROCESSING', 'thread') == 'thread':
+        request_started.connect(recover_on_first_request)
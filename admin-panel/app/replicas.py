@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+REPLICA_ALIAS = 'replica'
+
+# Set after a staff write; while present, analytics read from the primary
+PIN_COOKIE = 'db_primary_pin'
+
+_state = threading.local()
+_replica_down_until = 0
+
+
+def replica_alias():
+    """The replica to read from, or None if there is none or it recently failed"""
+    if REPLICA_ALIAS not in settings.DATABASES or time.monotonic() < _replica_down_until:
+        return None
+    return REPLICA_ALIAS
+
+
+def mark_replica_down():
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+
+@contextmanager
+def reads_from_replica():
+    """Route this thread's reads to the replica while the block runs"""
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica inside reads_from_replica() and everything
+    else to the primary. Writes always go to the primary, even for objects
+    that were read from the replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'depth', 0):
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows
+        return True
+
+
+def stream_from_replica(content):
+    """Keep a streaming response on the replica while the server consumes it"""
+    content = iter(content)
+    while True:
+        with reads_from_replica():
+            chunk = next(content, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def replica_view(view):
+    """
+    Serve a read-only view from the replica. Uses the primary when no
+    replica is configured, while the request carries PIN_COOKIE, and, after
+    retrying once, when the replica fails.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if replica_alias() is None or PIN_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+
+        # The session and user come from the primary; a login the replica
+        # hasn't caught up with must not look like a logout
+        if hasattr(request, 'user'):
+            request.user.is_authenticated
+
+        try:
+            with reads_from_replica():
+                response = view(request, *args, **kwargs)
+        except DatabaseError:
+            logger.exception('Replica read failed, falling back to the primary')
+            mark_replica_down()
+            return view(request, *args, **kwargs)
+
+        if response.streaming:
+            response.streaming_content = stream_from_replica(response.streaming_content)
+        return response
+    return wrapper
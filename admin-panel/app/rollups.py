@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+
+from .models import User, ExamSession, DailyStats, UserActivity
+from . import timeseries
+
+
+METRICS = ('active_users', 'new_signups', 'tests_completed')
+
+
+def metric_source(metric):
+    """Raw queryset and datetime field a DailyStats column is derived from"""
+    if metric == 'active_users':
+        if getattr(settings, 'ACTIVITY_LOG', True):
+            return UserActivity.objects.filter(user__is_staff=False), 'first_seen'
+        return User.objects.filter(is_staff=False), 'last_active'
+    if metric == 'new_signups':
+        return User.objects.filter(is_staff=False), 'created_at'
+    if metric == 'tests_completed':
+        return ExamSession.objects.filter(status='completed'), 'completed_at'
+    raise ValueError(f"Unknown metric: {metric}")
+
+
+def finalized():
+    """DailyStats rows that were rolled up from raw tables (never today)"""
+    return DailyStats.objects.filter(computed_at__isnull=False, date__lt=timezone.localdate())
+
+
+def watermark():
+    """Last day that has been rolled up, or None"""
+    return finalized().aggregate(last=Max('date'))['last']
+
+
+def earliest_raw_date():
+    dates = []
+    for metric in METRICS:
+        queryset, field = metric_source(metric)
+        first = timeseries.first_date(queryset, field, timezone.get_current_timezone())
+        if first:
+            dates.append(first)
+    return min(dates) if dates else None
+
+
+def compute_days(start, end):
+    """Compute every metric for each day in [start, end] from raw tables"""
+    tzinfo = timezone.get_current_timezone()
+    days = {day: {} for day in timeseries.iter_buckets(start, end, 'day')}
+    for metric in METRICS:
+        queryset, field = metric_source(metric)
+        for day, total in timeseries.count_series(queryset, field, start, end, 'day', tzinfo):
+            days[day][metric] = total
+    return days
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute DailyStats rows for [start, end] from raw tables and mark them
+    final. The raw tables are the source of truth and nothing else writes
+    DailyStats, so every column is overwritten. `end` is clamped to yesterday because today is still partial, and
+    `start` never skips past the current watermark, so finalized days always
+    form one contiguous range. Returns the number of days written.
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    end = min(end or yesterday, yesterday)
+    last = watermark()
+    if start is None:
+        start = earliest_raw_date()
+    if last and (start is None or start > last + timedelta(days=1)):
+        start = last + timedelta(days=1)
+    if start is None or start > end:
+        return 0
+
+    now = timezone.now()
+    rows = [
+        DailyStats(date=day, computed_at=now, **values)
+        for day, values in compute_days(start, end).items()
+    ]
+    with transaction.atomic():
+        DailyStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=list(METRICS) + ['computed_at'],
+        )
+    return len(rows)
+
+
+def roll_forward():
+    """
+    Roll up every complete day after the watermark. Safe to run repeatedly,
+    e.g. from cron: once caught up it does nothing.
+    """
+    last = watermark()
+    return rebuild(start=last + timedelta(days=1) if last else None)
+
+
+def daily_values(metric, start, end):
+    """
+    {date: value} for [start, end], reading finalized rows and computing only
+    the days that have not been rolled up (at least today) live.
+    """
+    values = {}
+    if start < timezone.localdate():
+        values = dict(finalized().filter(
+            date__gte=start, date__lte=end
+        ).values_list('date', metric))
+
+    missing = [day for day in timeseries.iter_buckets(start, end, 'day') if day not in values]
+    if missing:
+        queryset, field = metric_source(metric)
+        live = timeseries.count_series(
+            queryset, field, missing[0], missing[-1], 'day', timezone.get_current_timezone()
+        )
+        values.update((day, value) for day, value in live if day not in values)
+    return values
+
+
+def series(metric, start, end, granularity='day', tzinfo=None):
+    """
+    Same shape as timeseries.count_series, served from the rollup. DailyStats
+    days are in the project timezone (the dashboard charts use it); any other
+    `tzinfo` is computed live from the raw tables.
+    """
+    if granularity not in timeseries.GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    if tzinfo is not None and str(tzinfo) != str(timezone.get_current_timezone()):
+        queryset, field = metric_source(metric)
+        return timeseries.count_series(queryset, field, start, end, granularity, tzinfo)
+
+    totals = {}
+    range_start = timeseries.bucket_start(start, granularity)
+    for day, value in daily_values(metric, range_start, end).items():
+        bucket = timeseries.bucket_start(day, granularity)
+        totals[bucket] = totals.get(bucket, 0) + value
+    return [(bucket, totals.get(bucket, 0)) for bucket in timeseries.iter_buckets(start, end, granularity)]
+
+
+def total(metric):
+    """All-time total of a metric: the finalized rows plus live counts outside them"""
+    rolled = finalized().aggregate(first=Min('date'), last=Max('date'), total=Sum(metric))
+    queryset, field = metric_source(metric)
+    if rolled['first'] is None:
+        return queryset.count()
+
+    tzinfo = timezone.get_current_timezone()
+    before = datetime.combine(rolled['first'], time.min, tzinfo=tzinfo)
+    after = datetime.combine(rolled['last'] + timedelta(days=1), time.min, tzinfo=tzinfo)
+    live = queryset.filter(**{f'{field}__lt': before}).count() + \
+        queryset.filter(**{f'{field}__gte': after}).count()
+    return rolled['total'] + live
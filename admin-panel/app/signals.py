@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Question, PricingSettings, ExamSession, User, pricing_settings
+from . import caching, exam_cache
+from .leaderboard import leaderboard
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, **kwargs):
+    transaction.on_commit(exam_cache.invalidate_questions)
+
+
+@receiver(post_save, sender=PricingSettings)
+def pricing_changed(sender, **kwargs):
+    # After commit, so no worker can reload the old row under the new version
+    transaction.on_commit(pricing_settings.invalidate)
+    transaction.on_commit(lambda: caching.invalidate('pricing'))
+
+
+@receiver(post_save, sender=ExamSession)
+def exam_session_saved(sender, instance, **kwargs):
+    if instance.status == 'completed':
+        transaction.on_commit(lambda: caching.invalidate('leaderboard', 'dashboard_stats'))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, created, **kwargs):
+    # Profile edits don't change the totals, new accounts do
+    if created:
+        transaction.on_commit(lambda: caching.invalidate('dashboard_stats'))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, **kwargs):
+    transaction.on_commit(leaderboard.invalidate)
+    transaction.on_commit(lambda: caching.invalidate('leaderboard', 'dashboard_stats'))
@@ -1,3 +1,1170 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.db import DatabaseError, IntegrityError, OperationalError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import datetime, timedelta
+from unittest import mock
+import base64
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zoneinfo
 
-# Create your tests here.
+from satly.settings import database_from_url
+
+from . import caching, context_processors, exam_cache, exam_timer, pagination, payments, replicas, rollups, views
+from .buffers import ActivityLog, BufferedWriter
+from .distribution import ScoreDistribution
+from .exam_cache import answer_keys, module_payloads
+from .management.commands.explain_hot_queries import full_scans, hot_queries
+from .leaderboard import Leaderboard
+from .middleware import ReplicaPinMiddleware
+from .models import CacheVersion, DailyStats, ExamAnswer, ExamSession, Payment, PricingSettings, Question, ScoreBucket, Test, TestResult, User, UserActivity, UserExamStats, pricing_settings
+
+# The test client sends request_started too; startup recovery would run the
+# payment backlog from a pool thread, outside the test's transaction
+request_started.disconnect(payments.recover_on_first_request)
+
+
+class DailyActiveUsersChartTests(TestCase):
+    def setUp(self):
+        student = User.objects.create_user('student', 'student@example.com', 'pw')
+        first_seen = timezone.now() - timedelta(days=3)
+        UserActivity.objects.create(user=student, date=timezone.localdate(first_seen), first_seen=first_seen)
+
+    def test_all_time_range(self):
+        response = self.client.get('/api/dashboard/daily-active-users/?days=all')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(len(data), 4)
+        self.assertEqual(sum(day['active_users'] for day in data), 1)
+
+    def test_invalid_range(self):
+        response = self.client.get('/api/dashboard/daily-active-users/?days=soon')
+        self.assertEqual(response.status_code, 400)
+
+
+class ActivityLogTests(TestCase):
+    def setUp(self):
+        self.log = ActivityLog()
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BufferedWriter()
+
+    @override_settings(ACTIVITY_FLUSH_INTERVAL=60)
+    def test_deleted_user_is_skipped(self):
+        kept = User.objects.create_user('kept', 'kept@example.com', 'pw')
+        deleted = User.objects.create_user('deleted', 'deleted@example.com', 'pw')
+        self.log.record(kept.pk)
+        self.log.record(deleted.pk)
+        deleted.delete()
+        self.log.flush()
+        self.assertEqual(list(UserActivity.objects.values_list('user_id', flat=True)), [kept.pk])
+
+    @override_settings(ACTIVITY_FLUSH_INTERVAL=60)
+    def test_integrity_error_drops_batch(self):
+        user = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.log.record(user.pk)
+        with mock.patch.object(ActivityLog, 'write', side_effect=IntegrityError), self.assertLogs('app.buffers', 'ERROR'):
+            self.log.flush()
+        self.assertEqual(self.log._pending, {})
+
+    @override_settings(ACTIVITY_FLUSH_INTERVAL=60)
+    def test_other_errors_keep_batch(self):
+        user = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.log.record(user.pk)
+        with mock.patch.object(ActivityLog, 'write', side_effect=OperationalError), self.assertLogs('app.buffers', 'ERROR'):
+            self.log.flush()
+        self.log.flush()
+        self.assertTrue(UserActivity.objects.filter(user=user).exists())
+
+
+class CacheIsolationMixin:
+    """Each test starts with an empty cache and unknown version stamps"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        caching._versions.clear()
+
+
+class ViewCacheTests(CacheIsolationMixin, TestCase):
+    def test_response_is_cached(self):
+        self.assertEqual(self.client.get('/api/pricing/').json()['exam_price'], '19999.00')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/pricing/').json()['exam_price'], '19999.00')
+
+    def test_price_change_invalidates(self):
+        self.client.get('/api/pricing/')
+        with self.captureOnCommitCallbacks(execute=True):
+            prices = PricingSettings.load()
+            prices.exam_price = 25000
+            prices.save()
+        self.assertEqual(self.client.get('/api/pricing/').json()['exam_price'], '25000.00')
+
+    @override_settings(CACHE_VERSION_CHECK_INTERVAL=0)
+    def test_change_in_another_worker_invalidates(self):
+        self.client.get('/api/pricing/')
+        # What the other worker's save leaves behind: the row and the shared stamps
+        PricingSettings.objects.update(exam_price=30000)
+        CacheVersion.objects.filter(
+            key__in=[caching.group_version_key('pricing'), 'pricing_settings:version']
+        ).update(version='another-worker')
+        self.assertEqual(self.client.get('/api/pricing/').json()['exam_price'], '30000.00')
+
+    def test_bump_never_reuses_a_version(self):
+        first = caching.get_version('test:version')
+        second = caching.bump_version('test:version')
+        self.assertNotEqual(second, first)
+        self.assertEqual(caching.get_version('test:version'), second)
+        self.assertEqual(CacheVersion.objects.get(key='test:version').version, second)
+
+    def test_single_flight_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(caching.single_flight('test:flight', compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+def make_question(category='english', module=1, number=1, correct_answer='A'):
+    return Question.objects.create(
+        category=category, module=module, question_number=number, question_text=f'Question {number}',
+        option_a='A', option_b='B', option_c='C', option_d='D', correct_answer=correct_answer,
+    )
+
+
+class AnswerKeyCacheTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        answer_keys.clear()
+        self.question = make_question()
+
+    def test_lookups_are_served_from_memory(self):
+        self.assertEqual(answer_keys.get('english', 1), {self.question.id: 'A'})
+        with self.assertNumQueries(0):
+            self.assertEqual(answer_keys.get('english', 1), {self.question.id: 'A'})
+
+    def test_question_edit_invalidates(self):
+        answer_keys.get('english', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.correct_answer = 'C'
+            self.question.save()
+        self.assertEqual(answer_keys.get('english', 1), {self.question.id: 'C'})
+
+    @override_settings(EXAM_CACHE_CHECK_INTERVAL=0, CACHE_VERSION_CHECK_INTERVAL=0)
+    def test_edit_in_another_worker_invalidates(self):
+        answer_keys.get('english', 1)
+        Question.objects.filter(id=self.question.id).update(correct_answer='B')
+        CacheVersion.objects.filter(key=exam_cache.VERSION_KEY).update(version='another-worker')
+        self.assertEqual(answer_keys.get('english', 1), {self.question.id: 'B'})
+
+    @override_settings(EXAM_CACHE_CHECK_INTERVAL=0, EXAM_CACHE_MAX_AGE=0)
+    def test_entries_expire(self):
+        answer_keys.get('english', 1)
+        # An edit whose invalidation never arrived
+        Question.objects.filter(id=self.question.id).update(correct_answer='D')
+        self.assertEqual(answer_keys.get('english', 1), {self.question.id: 'D'})
+
+
+class ModulePayloadCacheTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        module_payloads.clear()
+        self.question = make_question()
+
+    @override_settings(EXAM_CACHE_CHECK_INTERVAL=0, CACHE_VERSION_CHECK_INTERVAL=0)
+    def test_edit_in_another_worker_changes_payload(self):
+        before = module_payloads.get('english', 1)
+        Question.objects.filter(id=self.question.id).update(question_text='Edited elsewhere')
+        CacheVersion.objects.filter(key=exam_cache.VERSION_KEY).update(version='another-worker')
+        after = module_payloads.get('english', 1)
+        self.assertIn('Edited elsewhere', after['json'])
+        self.assertNotEqual(after['etag'], before['etag'])
+
+    @override_settings(EXAM_CACHE_CHECK_INTERVAL=0, EXAM_CACHE_MAX_AGE=0)
+    def test_entries_expire(self):
+        module_payloads.get('english', 1)
+        Question.objects.filter(id=self.question.id).update(question_text='Edited without invalidation')
+        self.assertIn('Edited without invalidation', module_payloads.get('english', 1)['json'])
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            exam_cache.ModuleCache()
+
+
+class QuestionBankProvisioningTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        answer_keys.clear()
+        module_payloads.clear()
+
+    def test_empty_module_is_not_cached(self):
+        self.assertEqual(module_payloads.get('math', 2)['ids'], [])
+        self.assertEqual(answer_keys.get('math', 2), {})
+        # Provisioned by another process whose invalidation never arrives here
+        question = make_question('math', 2)
+        self.assertEqual(module_payloads.get('math', 2)['ids'], [question.id])
+        self.assertEqual(answer_keys.get('math', 2), {question.id: 'A'})
+
+    def test_command_bumps_shared_version(self):
+        before = caching.get_version(exam_cache.VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('provision_question_bank', category='math', module=1, stdout=io.StringIO())
+        self.assertEqual(Question.objects.filter(category='math', module=1).count(), 22)
+        self.assertNotEqual(CacheVersion.objects.get(key=exam_cache.VERSION_KEY).version, before)
+
+
+class ExamHeartbeatTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.session = ExamSession.objects.create(user=self.user)
+        exam_timer.start_module(self.session)
+
+    def heartbeat(self, **payload):
+        payload.setdefault('session_id', self.session.id)
+        return self.client.post('/api/exam/save-time/', json.dumps(payload), content_type='application/json').json()
+
+    def test_running_module(self):
+        data = self.heartbeat(section='english', module=1)
+        self.assertEqual((data['section'], data['module'], data['expired']), ('english', 1, False))
+        self.assertGreater(data['time_remaining'], 0)
+
+    def test_worker_that_missed_the_module_change(self):
+        stale = cache.get(exam_timer.timer_key(self.session.id, 'english', 1))
+        stale['deadline'] = (timezone.now() - timedelta(hours=1)).timestamp()
+        self.client.post(
+            '/api/exam/finish-section/', json.dumps({'session_id': self.session.id, 'section': 'english', 'module': 1}),
+            content_type='application/json'
+        )
+        # Another worker still holds the previous module's timer, already expired
+        cache.set(exam_timer.timer_key(self.session.id, 'english', 1), stale)
+        self.session.refresh_from_db()
+        exam_timer.start_module(self.session)
+
+        data = self.heartbeat(section='english', module=2)
+        self.assertEqual((data['section'], data['module'], data['expired']), ('english', 2, False))
+
+    def test_page_without_module_gets_the_current_one(self):
+        data = self.heartbeat()
+        self.assertEqual((data['section'], data['module']), ('english', 1))
+
+    def test_invalid_module(self):
+        response = self.client.post(
+            '/api/exam/save-time/', json.dumps({'session_id': self.session.id, 'module': 'first'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class DailyStatsRollupTests(TestCase):
+    def setUp(self):
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+        # Rolled-up day with no raw rows behind it, so the test can tell the sources apart
+        DailyStats.objects.create(date=self.yesterday, tests_completed=7, computed_at=timezone.now())
+
+    def test_site_timezone_reads_rollup(self):
+        series = rollups.series('tests_completed', self.yesterday, timezone.localdate())
+        self.assertEqual(series, [(self.yesterday, 7), (timezone.localdate(), 0)])
+
+    def test_dashboard_chart_reads_rollup(self):
+        data = self.client.get('/api/dashboard/tests-completed/?days=2&granularity=day').json()['data']
+        self.assertEqual([day['tests_completed'] for day in data], [7, 0])
+
+    def test_other_timezone_is_live(self):
+        tzinfo = zoneinfo.ZoneInfo('Pacific/Kiritimati')
+        series = rollups.series('tests_completed', self.yesterday, self.yesterday, tzinfo=tzinfo)
+        self.assertEqual(series, [(self.yesterday, 0)])
+
+    def test_finishing_an_exam_leaves_rollup_alone(self):
+        user = User.objects.create_user('student', 'student@example.com', 'pw')
+        session = ExamSession.objects.create(user=user, current_section='math', current_module=2)
+        self.assertEqual(views.finish_module(session), 'results')
+        self.assertFalse(DailyStats.objects.filter(date=timezone.localdate()).exists())
+        self.assertEqual(rollups.daily_values('tests_completed', self.yesterday, timezone.localdate()),
+                         {self.yesterday: 7, timezone.localdate(): 1})
+
+    def test_rebuild_keeps_finalized_days(self):
+        self.assertEqual(rollups.roll_forward(), 0)
+        self.assertEqual(DailyStats.objects.get(date=self.yesterday).tests_completed, 7)
+
+
+@override_settings(LEADERBOARD_CHECK_INTERVAL=0)
+class LeaderboardTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(f'student{number}', f'student{number}@example.com', 'pw', best_score=score)
+            for number, score in enumerate([1400, 1200, 1000])
+        ]
+        # Two workers' copies
+        self.local = Leaderboard()
+        self.other = Leaderboard()
+        self.local.top(10)
+        self.other.top(10)
+
+    def complete_exam(self, user, score):
+        ExamSession.objects.create(user=user, status='completed', total_score=score, completed_at=timezone.now())
+        User.objects.filter(pk=user.pk).update(best_score=score)
+
+    def test_improvement_is_applied_in_place(self):
+        version = caching.get_version('leaderboard:version')
+        self.assertTrue(self.local.record_score(self.users[2].pk, 1500))
+        self.assertFalse(self.local.record_score(self.users[0].pk, 1300))
+        self.assertEqual(self.local.top(2), [(self.users[2].pk, 1500), (self.users[0].pk, 1400)])
+        self.assertEqual(caching.get_version('leaderboard:version'), version)
+
+    def test_other_worker_catches_up_without_rebuilding(self):
+        self.complete_exam(self.users[2], 1500)
+        self.local.record_score(self.users[2].pk, 1500)
+        with self.assertNumQueries(1):
+            position = self.other.position(self.users[2].pk)
+        self.assertEqual((position['rank'], position['total']), (1, 3))
+
+    def test_ties_share_a_rank(self):
+        self.local.record_score(self.users[2].pk, 1200)
+        self.assertEqual(self.local.position(self.users[1].pk)['rank'], 2)
+        self.assertEqual(self.local.position(self.users[2].pk)['rank'], 2)
+
+    def test_invalidate_rebuilds_everywhere(self):
+        self.users[0].delete()
+        self.local.invalidate()
+        self.assertIsNone(self.other.position(self.users[0].pk))
+        self.assertEqual(self.other.size(), 2)
+
+
+class ScoreDistributionTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        for score in [1000, 1200, 1400]:
+            self.record(score)
+        # Two workers' copies
+        self.local = ScoreDistribution()
+        self.other = ScoreDistribution()
+        self.local.percentile('total', 0)
+        self.other.percentile('total', 0)
+
+    def record(self, total):
+        session = ExamSession(user=self.user, total_score=total, english_score=total // 2, math_score=total // 2)
+        ScoreDistribution().record(session)
+        return session
+
+    def test_completion_is_applied_in_place(self):
+        version = caching.get_version('score_distribution:version')
+        self.local.add(self.record(1100))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.local.percentile('total', 1100), 50)
+        self.assertEqual(caching.get_version('score_distribution:version'), version)
+
+    @override_settings(SCORE_DISTRIBUTION_MAX_AGE=0)
+    def test_other_worker_reloads_after_max_age(self):
+        self.local.add(self.record(1100))
+        self.assertEqual(self.other.percentile('total', 1100), 50)
+
+    def test_invalidate_reloads_everywhere(self):
+        ScoreBucket.objects.filter(metric='total', score=1000).delete()
+        self.local.invalidate()
+        self.assertEqual(self.other.percentile('total', 1200), 50)
+
+    def test_result_page_shows_every_percentile(self):
+        self.client.force_login(self.user)
+        exam = ExamSession.objects.create(
+            user=self.user, status='completed', completed_at=timezone.now(),
+            total_score=1200, english_score=750, math_score=450,
+        )
+        response = self.client.get(f'/exam/result/{exam.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.context['total_percentile'], response.context['english_percentile'], response.context['math_percentile']),
+            (67, 99, 1),
+        )
+        for percentile in [67, 99, 1]:
+            self.assertContains(response, f'<strong>{percentile}th</strong>')
+
+
+class InlineExecutor:
+    def submit(self, function, *args):
+        function(*args)
+
+
+@override_settings(PAYMENT_GATEWAY_DELAY=0, PAYMENT_STALE_MINUTES=10)
+class PaymentProcessingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+
+    def create_payment(self, **fields):
+        return Payment.objects.create(
+            user=self.user, payment_method='click', amount=100, card_number='4242', **fields
+        )
+
+    def test_charge_start_is_recorded(self):
+        payment = self.create_payment()
+        self.assertEqual(payments.process_payment(payment.pk), 'completed')
+        payment.refresh_from_db()
+        self.assertIsNotNone(payment.processing_started_at)
+        self.assertEqual(payment.status, 'completed')
+
+    def test_stale_check_uses_the_charge_start(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        charging = self.create_payment(status='processing', processing_started_at=timezone.now())
+        stuck = self.create_payment(status='processing', processing_started_at=hour_ago)
+        # An old payment whose charge only just started is still in flight
+        Payment.objects.filter(pk__in=[charging.pk, stuck.pk]).update(created_at=hour_ago)
+        with self.assertLogs('app.payments', 'WARNING'):
+            self.assertEqual(payments.fail_stale(), 1)
+        self.assertEqual(
+            dict(Payment.objects.values_list('pk', 'status')),
+            {charging.pk: 'processing', stuck.pk: 'failed'},
+        )
+
+    def test_recover_queues_pending_payments(self):
+        pending = [self.create_payment(), self.create_payment()]
+        with mock.patch.object(payments, 'get_executor', return_value=InlineExecutor()):
+            payments.recover()
+        self.assertEqual(
+            list(Payment.objects.filter(pk__in=[payment.pk for payment in pending]).values_list('status', flat=True)),
+            ['completed', 'completed'],
+        )
+
+    def test_lost_transition_is_logged(self):
+        payment = self.create_payment()
+
+        def charge_after_going_stale(gateway, charged):
+            Payment.objects.filter(pk=charged.pk).update(status='failed')
+            return payments.GatewayResult(True, reference='ref123')
+
+        with mock.patch.object(payments.FakeGateway, 'charge', charge_after_going_stale), \
+                self.assertLogs('app.payments', 'ERROR') as logs:
+            self.assertIsNone(payments.process_payment(payment.pk))
+        self.assertIn('ref123', logs.output[0])
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+
+
+class HotQueryIndexTests(TestCase):
+    EXPECTED_INDEXES = {
+        'user exam history': 'exam_user_status_done_idx',
+        'unfinished exam lookup': 'exam_user_status_done_idx',
+        'tests completed per day': 'exam_completed_at_idx',
+        'signups per day': 'users_student_created_idx',
+        'last active per day': 'users_student_active_idx',
+        'activity per day': 'user_activity_first_seen_idx',
+        'admin users first page': 'users_student_created_idx',
+        'top band scores': 'users_ranked_score_idx',
+        'payment totals': 'payments_status_type_idx',
+        'payment ledger first page': 'payments_created_id_idx',
+    }
+
+    def test_hot_queries_use_their_indexes(self):
+        queries = dict(hot_queries())
+        self.assertEqual(queries.keys(), self.EXPECTED_INDEXES.keys())
+        for name, index in self.EXPECTED_INDEXES.items():
+            with self.subTest(name):
+                plan = queries[name].explain()
+                self.assertEqual(full_scans(plan), [])
+                self.assertIn(index, plan)
+
+    def test_explain_command_passes(self):
+        output = io.StringIO()
+        call_command('explain_hot_queries', stdout=output)
+        self.assertNotIn('FAIL', output.getvalue())
+
+
+# Only the settings entry matters; no test opens a connection to it
+@mock.patch.dict(settings.DATABASES, replica={'ENGINE': 'django.db.backends.sqlite3'})
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.staff = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        self.addCleanup(setattr, replicas, '_replica_down_until', 0)
+
+    def read_database(self, request):
+        return HttpResponse(User.objects.all().db)
+
+    def test_reads_go_to_the_replica(self):
+        view = replicas.replica_view(self.read_database)
+        self.assertEqual(view(self.factory.get('/')).content, b'replica')
+        self.assertEqual(User.objects.all().db, 'default')
+
+    def test_writes_go_to_default(self):
+        with replicas.reads_from_replica():
+            self.assertEqual(User.objects.all().db, 'replica')
+            user = User.objects.create_user('student', 'student@example.com', 'pw')
+            user.first_name = 'Changed'
+            user.save()
+        self.assertEqual(user._state.db, 'default')
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, 'Changed')
+
+    def test_staff_write_pins_reads_to_default(self):
+        request = self.factory.post('/')
+        request.user = self.staff
+        response = ReplicaPinMiddleware(lambda request: HttpResponse())(request)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+        pinned = self.factory.get('/')
+        pinned.COOKIES[replicas.PIN_COOKIE] = response.cookies[replicas.PIN_COOKIE].value
+        view = replicas.replica_view(self.read_database)
+        self.assertEqual(view(pinned).content, b'default')
+
+    def test_reads_and_failed_writes_do_not_pin(self):
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse(status=400))
+        for request in [self.factory.get('/'), self.factory.post('/')]:
+            request.user = self.staff
+            self.assertNotIn(replicas.PIN_COOKIE, middleware(request).cookies)
+
+    def test_replica_failure_falls_back_to_default(self):
+        databases = []
+
+        def flaky(request):
+            databases.append(User.objects.all().db)
+            if databases[-1] == 'replica':
+                raise DatabaseError('replica unavailable')
+            return HttpResponse(databases[-1])
+
+        view = replicas.replica_view(flaky)
+        with self.assertLogs('app.replicas', 'ERROR'):
+            self.assertEqual(view(self.factory.get('/')).content, b'default')
+        self.assertIsNone(replicas.replica_alias())
+        self.assertEqual(view(self.factory.get('/')).content, b'default')
+        self.assertEqual(databases, ['replica', 'default', 'default'])
+
+
+# A 1x1 transparent PNG
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII='
+)
+
+
+class ExternalizeQuestionImagesTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_test(self, image):
+        return Test.objects.create(
+            title='Reading', category='english', test_type='reading', duration=32,
+            test_questions=[{'question': 'Q1', 'image': image}, {'question': 'Q2'}],
+        )
+
+    def run_command(self, *args):
+        output = io.StringIO()
+        call_command('externalize_question_images', *args, stdout=output, stderr=io.StringIO())
+        return output.getvalue()
+
+    def test_inline_images_are_moved_to_files(self):
+        test = self.create_test('data:image/png;base64,' + base64.b64encode(PNG).decode())
+        self.assertIn('Moved 1 image(s) from 1 test(s)', self.run_command())
+        test.refresh_from_db()
+        url = test.test_questions[0]['image']
+        self.assertTrue(url.startswith('/media/question_images/'))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, url[len('/media/'):])))
+        self.assertIn('Moved 0 image(s)', self.run_command())
+
+    def test_dry_run_writes_nothing(self):
+        inline = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+        test = self.create_test(inline)
+        self.assertIn('Would move 1 image(s) from 1 test(s)', self.run_command('--dry-run'))
+        test.refresh_from_db()
+        self.assertEqual(test.test_questions[0]['image'], inline)
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_unreadable_images_stay_inline(self):
+        broken = 'data:image/png;base64,' + base64.b64encode(b'not an image').decode()
+        test = self.create_test(broken)
+        self.assertIn('1 test(s) had unreadable images', self.run_command())
+        test.refresh_from_db()
+        self.assertEqual(test.test_questions[0]['image'], broken)
+
+
+class HealthCheckTests(TestCase):
+    def test_anonymous_probe_only_sees_the_status(self):
+        response = self.client.get('/healthz/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+    def test_staff_see_the_details(self):
+        self.client.force_login(User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True))
+        body = self.client.get('/healthz/').json()
+        self.assertEqual(body['database_vendor'], 'sqlite')
+        self.assertEqual(body['checks'], {'database': 'ok', 'cache': 'ok'})
+
+    def test_failure_returns_503_without_details(self):
+        with mock.patch.object(views.cache, 'get', return_value=None):
+            response = self.client.get('/healthz/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'error'})
+
+
+class ExamTestMixin(CacheIsolationMixin):
+    """A signed-in student with a running exam over a small question bank"""
+
+    def setUp(self):
+        super().setUp()
+        answer_keys.clear()
+        module_payloads.clear()
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.questions = {
+            (category, module): [make_question(category, module, number, 'A') for number in (1, 2)]
+            for category in ('english', 'math') for module in (1, 2)
+        }
+        self.session = ExamSession.objects.create(user=self.user)
+        exam_timer.start_module(self.session)
+
+    def post(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def save_answers(self, *pairs):
+        return self.post('/api/exam/save-answers/', {
+            'session_id': self.session.id,
+            'answers': [{'question_id': question_id, 'answer': answer} for question_id, answer in pairs],
+        })
+
+    def saved(self):
+        return dict(ExamAnswer.objects.filter(exam_session=self.session).values_list('question_id', 'selected_answer'))
+
+
+class SaveAnswersTests(ExamTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.first, self.second = self.questions['english', 1]
+
+    def test_batch_is_saved(self):
+        response = self.save_answers((self.first.id, 'A'), (self.second.id, 'C'))
+        self.assertEqual(response.json(), {'success': True, 'saved': 2})
+        self.assertEqual(self.saved(), {self.first.id: 'A', self.second.id: 'C'})
+        self.assertEqual(
+            dict(ExamAnswer.objects.values_list('question_id', 'is_correct')),
+            {self.first.id: True, self.second.id: False},
+        )
+
+    def test_later_pairs_win(self):
+        self.save_answers((self.first.id, 'B'), (self.first.id, 'D'))
+        self.assertEqual(self.saved(), {self.first.id: 'D'})
+
+    def test_empty_answer_clears(self):
+        self.save_answers((self.first.id, 'A'))
+        self.save_answers((self.first.id, ''))
+        self.assertEqual(self.saved(), {self.first.id: None})
+
+    def test_unknown_questions_are_skipped(self):
+        response = self.save_answers((self.first.id, 'A'), (999999, 'A'))
+        self.assertEqual(response.json()['saved'], 1)
+        self.assertEqual(self.saved(), {self.first.id: 'A'})
+
+    def test_other_modules_are_saved_but_not_scored(self):
+        other_module = self.questions['math', 1][0]
+        self.save_answers((other_module.id, 'A'))
+        self.assertEqual(self.saved(), {other_module.id: 'A'})
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.english_module1_score, self.session.math_module1_score), (0, 0))
+
+    def test_batch_limit(self):
+        response = self.save_answers(*[(self.first.id, 'A')] * (views.MAX_ANSWER_BATCH + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.saved(), {})
+
+    def test_answers_must_be_a_list(self):
+        for answers in [{'question_id': self.first.id, 'answer': 'A'}, 'A', None]:
+            response = self.post('/api/exam/save-answers/', {'session_id': self.session.id, 'answers': answers})
+            self.assertEqual(response.status_code, 400)
+
+    def test_expired_module(self):
+        ExamSession.objects.filter(pk=self.session.pk).update(module_deadline=timezone.now() - timedelta(hours=1))
+        response = self.save_answers((self.first.id, 'A'))
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()['expired'])
+        self.assertEqual(self.saved(), {})
+
+
+class ModuleScoreTests(ExamTestMixin, TestCase):
+    def finish(self):
+        section, module = self.session.current_section, self.session.current_module
+        response = self.post('/api/exam/finish-section/', {'session_id': self.session.id, 'section': section, 'module': module})
+        self.session.refresh_from_db()
+        return response.json()['next_action']
+
+    def start_next(self, seconds_used=0):
+        """Open the exam page for the next module and pretend `seconds_used` have passed"""
+        self.client.get('/exam/')
+        ExamSession.objects.filter(pk=self.session.pk).update(
+            module_started_at=timezone.now() - timedelta(seconds=seconds_used)
+        )
+        self.session.refresh_from_db()
+
+    def answer_module(self, correct):
+        """Answer the current module's two questions, `correct` of them right"""
+        first, second = self.questions[self.session.current_section, self.session.current_module]
+        self.save_answers((first.id, 'A' if correct > 0 else 'B'), (second.id, 'A' if correct > 1 else 'B'))
+
+    def complete_exam(self, seconds_per_module=0):
+        self.start_next(seconds_per_module)
+        for step in range(4):
+            self.answer_module(2)
+            action = self.finish()
+            if action != 'results':
+                self.start_next(seconds_per_module)
+        return action
+
+    def test_correct_answer_changed_to_wrong(self):
+        first, _ = self.questions['english', 1]
+        self.save_answers((first.id, 'A'))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.english_module1_score, 1)
+        self.save_answers((first.id, 'C'))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.english_module1_score, 0)
+
+    def test_resending_an_answer_keeps_the_score(self):
+        first, second = self.questions['english', 1]
+        self.save_answers((first.id, 'A'), (second.id, 'A'))
+        self.save_answers((first.id, 'A'), (second.id, 'A'))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.english_module1_score, 2)
+
+    def test_full_exam(self):
+        answered = {('english', 1): 2, ('english', 2): 1, ('math', 1): 0, ('math', 2): 2}
+        actions = []
+        self.start_next()
+        for (section, module), correct in answered.items():
+            self.assertEqual((self.session.current_section, self.session.current_module), (section, module))
+            self.answer_module(correct)
+            with CaptureQueriesContext(connection) as queries:
+                actions.append(self.finish())
+            if actions[-1] != 'results':
+                self.start_next()
+
+        self.assertEqual(actions, ['next_module', 'break', 'next_module', 'results'])
+        session = self.session
+        self.assertEqual(
+            (session.english_module1_score, session.english_module2_score, session.math_module1_score, session.math_module2_score),
+            (2, 1, 0, 2),
+        )
+        self.assertEqual(session.english_score, views.calculate_section_score(3, 54))
+        self.assertEqual(session.math_score, views.calculate_section_score(2, 44))
+        self.assertEqual(session.total_score, session.english_score + session.math_score)
+        self.assertEqual(session.status, 'completed')
+
+        user_updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "users"')]
+        self.assertEqual(len(user_updates), 1)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.tests_completed, self.user.best_score), (1, session.total_score))
+
+    def test_time_spent_is_not_rounded_per_exam(self):
+        # Two exams of 4 x 25s: 1m40s each, 3m20s in total
+        for exam in range(2):
+            if exam:
+                self.session = ExamSession.objects.create(user=self.user)
+            self.assertEqual(self.complete_exam(seconds_per_module=25), 'results')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.exam_stats.total_time_spent, 200)
+        self.assertEqual(self.user.total_time_spent, 3)
+
+
+class AdminUsersListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        joined = timezone.now() - timedelta(days=1)
+        # Pairs of students share a join time, a test count and an average, so every sort has ties
+        cls.students = []
+        for number in range(7):
+            student = User.objects.create_user(
+                f'student{number}', f'student{number}@example.com', 'pw',
+                first_name=f'Student{number}', created_at=joined - timedelta(hours=number // 2),
+                subscription='premium' if number % 3 == 0 else 'free',
+                status='suspended' if number == 4 else 'active',
+            )
+            for exam in range(number // 2):
+                ExamSession.objects.create(user=student, status='completed', total_score=1000 + 100 * (number // 2))
+            cls.students.append(student)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get(self, **params):
+        return self.client.get('/api/admin/users/', params)
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            page_params = dict(params, limit=2, **({'cursor': cursor} if cursor else {}))
+            data = self.get(**page_params).json()
+            ids += [user['id'] for user in data['users']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_every_sort_pages_without_duplicates_or_gaps(self):
+        expected = {student.id for student in self.students}
+        for sort in ['date', 'band', 'tests']:
+            with self.subTest(sort):
+                ids = self.walk(sort=sort)
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(set(ids), expected)
+
+    def test_order_within_ties(self):
+        self.assertEqual(self.walk(sort='tests'), [student.id for student in sorted(
+            self.students, key=lambda student: (student.exam_sessions.count(), student.id), reverse=True
+        )])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.get(cursor='not-a-cursor').status_code, 400)
+        self.assertEqual(self.get(cursor=pagination.encode_cursor([1])).status_code, 400)
+        self.assertEqual(self.get(cursor=pagination.encode_cursor(['yesterday', 1])).status_code, 400)
+        self.assertEqual(self.get(sort='popular').status_code, 400)
+
+    def test_cursor_from_another_sort(self):
+        date_cursor = self.get(sort='date', limit=2).json()['next_cursor']
+        self.assertEqual(self.get(sort='tests', cursor=date_cursor).status_code, 400)
+
+    def test_filters(self):
+        def listed(**params):
+            return {user['id'] for user in self.get(**params).json()['users']}
+
+        self.assertEqual(listed(search='student3@'), {self.students[3].id})
+        self.assertEqual(listed(status='suspended'), {self.students[4].id})
+        self.assertEqual(listed(subscription='active'), {self.students[number].id for number in (0, 3, 6)})
+        self.assertEqual(listed(subscription='inactive'), {self.students[number].id for number in (1, 2, 4, 5)})
+        self.assertEqual(self.get(search='student3@').json()['total'], 1)
+
+    def test_total_becomes_an_estimate_past_the_cap(self):
+        data = self.get().json()
+        self.assertEqual((data['total'], data['total_is_estimate']), (7, False))
+        with mock.patch.object(pagination, 'COUNT_CAP', 6):
+            data = self.get().json()
+        self.assertEqual((data['total'], data['total_is_estimate']), (6, True))
+        with mock.patch.object(pagination, 'COUNT_CAP', 7):
+            self.assertFalse(self.get().json()['total_is_estimate'])
+        self.assertNotIn('total', self.get(cursor=self.get(limit=2).json()['next_cursor']).json())
+
+
+class PaymentLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        student = User.objects.create_user('student', 'student@example.com', 'pw', first_name='Ali', last_name='Valiyev')
+        # Seven payments, one per evening (UTC), cycling through the kinds
+        cls.payments = []
+        for number in range(7):
+            payment = Payment.objects.create(
+                user=student, amount=100 + number, card_number='4242',
+                payment_type='subscription' if number % 2 else 'exam',
+                status='failed' if number == 3 else 'completed',
+                payment_method=['click', 'payme', 'uzcard'][number % 3],
+            )
+            created = timezone.make_aware(datetime(2026, 3, 1 + number, 20), zoneinfo.ZoneInfo('UTC'))
+            Payment.objects.filter(pk=payment.pk).update(created_at=created)
+            cls.payments.append(payment)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get(self, **params):
+        return self.client.get('/api/admin/payments/', params)
+
+    def listed(self, **params):
+        return [payment['id'] for payment in self.get(**params).json()['payments']]
+
+    def test_cursor_paging(self):
+        ids, cursor = [], None
+        while True:
+            data = self.get(limit=3, **({'cursor': cursor} if cursor else {})).json()
+            ids += [payment['id'] for payment in data['payments']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(ids, [payment.id for payment in reversed(self.payments)])
+        self.assertEqual(self.get(cursor='not-a-cursor').status_code, 400)
+
+    def test_filters(self):
+        ids = [payment.id for payment in self.payments]
+        self.assertEqual(self.listed(type='subscription'), [ids[5], ids[3], ids[1]])
+        self.assertEqual(self.listed(status='failed'), [ids[3]])
+        self.assertEqual(self.listed(method='payme'), [ids[4], ids[1]])
+        self.assertEqual(self.listed(date_from='2026-03-03', date_to='2026-03-04'), [ids[3], ids[2]])
+        self.assertEqual(self.get(date_from='March').status_code, 400)
+
+    @override_settings(TIME_ZONE='Asia/Tashkent')
+    def test_dates_are_local_days(self):
+        # 20:00 UTC on March 3 is already March 4 in Tashkent (UTC+5)
+        ids = [payment.id for payment in self.payments]
+        self.assertEqual(self.listed(date_from='2026-03-04', date_to='2026-03-04'), [ids[2]])
+
+    def test_date_filter_bounds_the_column(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(date_from='2026-03-03', date_to='2026-03-04')
+        ledger_sql = next(query['sql'] for query in queries if 'LIMIT' in query['sql'] and '"payments"' in query['sql'])
+        self.assertIn('"payments"."created_at" >=', ledger_sql)
+        self.assertIn('"payments"."created_at" <', ledger_sql)
+        self.assertNotIn('cast_date', ledger_sql)
+
+    def test_totals_come_from_one_query_on_the_first_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(limit=3).json()
+        aggregates = [query['sql'] for query in queries if 'SUM(' in query['sql']]
+        self.assertEqual(len(aggregates), 1)
+        self.assertEqual(
+            (data['total_revenue'], data['exam_count'], data['subscription_count']),
+            (float(sum(100 + number for number in range(7) if number != 3)), 4, 2),
+        )
+        self.assertNotIn('total_revenue', self.get(cursor=data['next_cursor']).json())
+
+    def test_csv_export(self):
+        response = self.get(format='csv', status='completed')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['transaction_id', 'user_name', 'user_email'])
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[1][1:5], ['Ali Valiyev', 'student@example.com', 'exam', '106.00'])
+
+
+class UserExamStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def complete(self, total, minutes_ago=0, time_spent=600):
+        session = ExamSession.objects.create(
+            user=self.user, status='completed', total_score=total, english_score=total // 2,
+            math_score=total - total // 2, time_spent=time_spent,
+            completed_at=timezone.now() - timedelta(minutes=minutes_ago),
+        )
+        return UserExamStats.record(session)
+
+    def test_created_on_first_completion(self):
+        self.assertFalse(UserExamStats.objects.filter(user=self.user).exists())
+        stats = self.complete(1200)
+        self.assertEqual(
+            (stats.exams_completed, stats.best_score, stats.last_score, stats.avg_score, stats.total_time_spent),
+            (1, 1200, 1200, 1200, 600),
+        )
+        self.assertEqual(UserExamStats.objects.get(user=self.user).recent_scores[0]['total'], 1200)
+
+    def test_keeps_the_latest_points_newest_first(self):
+        scores = [1000 + 10 * number for number in range(12)]
+        for number, score in enumerate(scores):
+            stats = self.complete(score, minutes_ago=len(scores) - number)
+        stats.refresh_from_db()
+        self.assertEqual([point['total'] for point in stats.recent_scores], scores[::-1][:UserExamStats.RECENT_LIMIT])
+        self.assertEqual(stats.exams_completed, 12)
+        self.assertEqual(stats.avg_score, round(sum(scores) / len(scores)))
+        self.assertEqual(stats.best_score, max(scores))
+        self.assertEqual(stats.total_time_spent, 12 * 600)
+
+    def test_best_score_is_not_the_last(self):
+        self.complete(1400)
+        stats = self.complete(1100)
+        self.assertEqual((stats.best_score, stats.last_score, stats.avg_score), (1400, 1100, 1250))
+
+    def test_pages_without_exams(self):
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context['recent_results'], response.context['total_time_display']), ([], '0h 0m'))
+        response = self.client.get('/dashboard/progress/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['no_results'])
+
+    def test_pages_render_from_the_stats(self):
+        for number, score in enumerate([1100, 1300, 1200]):
+            self.complete(score, minutes_ago=3 - number, time_spent=1800)
+        User.objects.filter(pk=self.user.pk).update(best_score=1300)
+        # Only the stats row holds the history; the sessions themselves aren't read
+        ExamSession.objects.all().delete()
+
+        response = self.client.get('/dashboard/')
+        self.assertEqual([exam['total'] for exam in response.context['recent_results']], [1200, 1300, 1100])
+        self.assertEqual(response.context['total_time_display'], '1h 30m')
+
+        response = self.client.get('/dashboard/progress/')
+        self.assertEqual(
+            (response.context['avg_score'], response.context['best_score'], response.context['total_tests']),
+            (1200, 1300, 3),
+        )
+        self.assertEqual([point['total'] for point in json.loads(response.context['scores_data'])], [1100, 1300, 1200])
+
+
+class TestsListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user('student', 'student@example.com', 'pw')
+        cls.tests = []
+        for number, scores in enumerate([[], [6, 7], [8, 8.5, 9]]):
+            test = Test.objects.create(
+                title=f'Test {number}', category='math' if number == 1 else 'english', test_type='reading',
+                duration=30, test_questions=[{'question': 'Q', 'image': 'x' * 1000}],
+            )
+            for score in scores:
+                TestResult.objects.create(user=student, test=test, score=score, time_spent=600)
+            cls.tests.append(test)
+
+    def get(self, **params):
+        return self.client.get('/api/tests/', params)
+
+    def test_one_query(self):
+        with self.assertNumQueries(1), CaptureQueriesContext(connection) as queries:
+            data = self.get().json()['data']
+        self.assertNotIn('test_questions', queries[0]['sql'])
+        self.assertEqual(
+            # avg_score is a Decimal, serialized as a string like before
+            [(row['title'], row['completions'], float(row['avg_score'])) for row in data],
+            [('Test 2', 3, 8.5), ('Test 1', 2, 6.5), ('Test 0', 0, 0)],
+        )
+        self.assertNotIn('next_cursor', self.get().json())
+
+    def test_fields_projection(self):
+        data = self.get(fields='id,completions', category='math').json()['data']
+        self.assertEqual(data, [{'id': self.tests[1].id, 'completions': 2}])
+
+    def test_unknown_fields(self):
+        response = self.get(fields='title,test_questions')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('test_questions', response.json()['error'])
+
+    def test_paging(self):
+        first = self.get(limit=2, fields='id').json()
+        self.assertEqual([row['id'] for row in first['data']], [self.tests[2].id, self.tests[1].id])
+        second = self.get(limit=2, fields='id', cursor=first['next_cursor']).json()
+        self.assertEqual(second, {'data': [{'id': self.tests[0].id}], 'next_cursor': None})
+        self.assertEqual(self.get(cursor='not-a-cursor').status_code, 400)
+
+
+class AdminAppListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        view_users = Permission.objects.get(codename='view_user', content_type__app_label='app')
+        view_sessions = Permission.objects.get(codename='view_examsession', content_type__app_label='app')
+        cls.staff = []
+        for number, permission in enumerate([view_users, view_users, view_sessions]):
+            user = User.objects.create_user(f'staff{number}', f'staff{number}@example.com', 'pw', is_staff=True)
+            user.user_permissions.add(permission)
+            cls.staff.append(user)
+
+    def setUp(self):
+        context_processors._app_lists.clear()
+        patcher = mock.patch.object(
+            context_processors.satly_admin_site, 'get_app_list',
+            side_effect=context_processors.satly_admin_site.get_app_list,
+        )
+        self.get_app_list = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def app_list(self, user):
+        request = RequestFactory().get('/admin-panel/')
+        # A fresh instance, as each request gets, so permissions aren't cached on it
+        request.user = User.objects.get(pk=user.pk)
+        return context_processors.admin_models(request)['admin_app_list']
+
+    def model_names(self, app_list):
+        return [model['object_name'] for app in app_list for model in app['models']]
+
+    def test_not_built_unless_read(self):
+        self.client.force_login(self.staff[0])
+        response = self.client.get('/admin-panel/')
+        self.assertEqual(response.status_code, 200)
+        self.get_app_list.assert_not_called()
+
+    def test_shared_by_staff_with_the_same_permissions(self):
+        first, second = self.app_list(self.staff[0]), self.app_list(self.staff[1])
+        self.assertEqual(self.model_names(first), ['User'])
+        self.assertEqual(self.model_names(second), ['User'])
+        self.assertEqual(self.get_app_list.call_count, 1)
+
+    def test_split_by_permissions(self):
+        users = self.model_names(self.app_list(self.staff[0]))
+        sessions = self.model_names(self.app_list(self.staff[2]))
+        self.assertEqual((users, sessions), (['User'], ['ExamSession']))
+        self.assertEqual(self.get_app_list.call_count, 2)
+
+    def test_non_staff_get_nothing(self):
+        student = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.assertEqual(self.app_list(student), [])
+        self.get_app_list.assert_not_called()
+
+
+class SQLiteSettingsTests(TestCase):
+    def test_new_connection_is_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = database_from_url(f'sqlite:///{directory}/tuned.sqlite3')
+            wrapper = DatabaseWrapper(connections.configure_settings({'default': database})['default'], 'tuned')
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    journal_mode = cursor.fetchone()[0]
+                    cursor.execute('PRAGMA busy_timeout')
+                    busy_timeout = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(busy_timeout, settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_benchmark_runs_on_scratch_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            configured = os.path.join(directory, 'configured.sqlite3')
+            result = subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_sqlite', '--writers', '2', '--readers', '1', '--saves', '5', '--questions', '3'],
+                cwd=settings.BASE_DIR, env=dict(os.environ, DATABASE_URL=f'sqlite:///{configured}'),
+                capture_output=True, text=True, timeout=120,
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertFalse(os.path.exists(configured))
+        self.assertRegex(result.stdout, r'default: .* saves/s')
+        self.assertRegex(result.stdout, r'tuned: .* saves/s')
+
+    def test_benchmark_rejects_bad_arguments(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_sqlite', writers=0)
+
+
+class PricingValueTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        pricing_settings.clear()
+        self.addCleanup(pricing_settings.clear)
+        PricingSettings.get_settings()
+        # A write that skips the signals, so no version stamp changes
+        PricingSettings.objects.update(exam_price=30000)
+
+    @override_settings(CACHE_VERSION_CHECK_INTERVAL=60)
+    def test_served_from_memory_within_max_age(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(PricingSettings.get_settings().exam_price, 19999)
+
+    @override_settings(PRICING_CACHE_MAX_AGE=0)
+    def test_reloaded_after_max_age(self):
+        self.assertEqual(PricingSettings.get_settings().exam_price, 30000)
@@ -0,0 +1,108 @@
+from django.db.models import Count, DateField, Min
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+import zoneinfo
+
+
+GRANULARITIES = ('day', 'week', 'month')
+
+LABEL_FORMATS = {
+    'day': '%b %d',
+    'week': '%b %d',
+    'month': '%b %Y',
+}
+
+
+def resolve_timezone(name=None):
+    """Return a tzinfo for an IANA name, falling back to the project timezone"""
+    if not name:
+        return timezone.get_current_timezone()
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def iter_buckets(start, end, granularity):
+    current = bucket_start(start, granularity)
+    while current <= end:
+        yield current
+        if granularity == 'week':
+            current += timedelta(days=7)
+        elif granularity == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=1)
+
+
+def local_midnight(day, tzinfo=None):
+    """Aware datetime at the start of the local `day`, for index-friendly range filters"""
+    return datetime.combine(day, time.min, tzinfo=tzinfo or timezone.get_current_timezone())
+
+
+def local_today(tzinfo):
+    return timezone.localtime(timezone.now(), tzinfo).date()
+
+
+def first_date(queryset, field, tzinfo):
+    """Local date of the earliest `field` value in the queryset, or None"""
+    first = queryset.aggregate(first=Min(field))['first']
+    if first is None:
+        return None
+    return timezone.localtime(first, tzinfo).date()
+
+
+def resolve_range(days, queryset, field, tzinfo, default_days=30):
+    """Turn a `?days=` value (a number or 'all') into a (start, end) date pair"""
+    end = local_today(tzinfo)
+    if days == 'all':
+        start = first_date(queryset, field, tzinfo) or end - timedelta(days=default_days)
+        return min(start, end), end
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        raise ValueError("days must be a number or 'all'")
+    if days < 1:
+        raise ValueError("days must be a positive number")
+    return end - timedelta(days=days - 1), end
+
+
+def count_series(queryset, field, start, end, granularity='day', tzinfo=None):
+    """
+    Count rows of `queryset` per day/week/month of the datetime `field` between
+    the local dates `start` and `end` (inclusive) with a single GROUP BY query.
+    Buckets without rows are zero-filled, so the result always covers the range.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    tzinfo = tzinfo or timezone.get_current_timezone()
+
+    range_start = local_midnight(bucket_start(start, granularity), tzinfo)
+    range_end = local_midnight(end + timedelta(days=1), tzinfo)
+
+    rows = queryset.filter(**{
+        f'{field}__gte': range_start,
+        f'{field}__lt': range_end,
+    }).annotate(
+        bucket=Trunc(field, granularity, output_field=DateField(), tzinfo=tzinfo)
+    ).values('bucket').annotate(total=Count('pk')).order_by('bucket')
+
+    counts = {row['bucket']: row['total'] for row in rows}
+    return [(bucket, counts.get(bucket, 0)) for bucket in iter_buckets(start, end, granularity)]
+
+
+def format_series(series, key, granularity='day'):
+    label_format = LABEL_FORMATS[granularity]
+    return [{
+        'date': bucket.strftime(label_format),
+        key: total,
+    } for bucket, total in series]
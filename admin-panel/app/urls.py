@@ -7,6 +7,7 @@ urlpatterns = [
     path('register/', views.register_page, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('quick-register/', views.quick_register, name='quick_register'),
+    path('healthz/', views.health_check, name='health_check'),
     
     path('dashboard/', views.user_dashboard, name='user_dashboard'),
     path('dashboard/avatar/', views.update_avatar, name='update_avatar'),
@@ -14,10 +15,12 @@ urlpatterns = [
     path('dashboard/settings/', views.user_settings, name='user_settings'),
     
     path('payment/', views.payment_page, name='payment_page'),
+    path('api/payments/<str:transaction_id>/status/', views.api_payment_status, name='api_payment_status'),
     path('exam/', views.start_exam, name='start_exam'),
     path('exam/result/<int:session_id>/', views.exam_result, name='exam_result'),
     
     path('api/exam/save-answer/', views.api_save_answer, name='api_save_answer'),
+    path('api/exam/save-answers/', views.api_save_answers, name='api_save_answers'),
     path('api/exam/save-time/', views.api_save_time, name='api_save_time'),
     path('api/exam/finish-section/', views.api_finish_section, name='api_finish_section'),
     path('api/exam/start-math/', views.api_start_math, name='api_start_math'),
@@ -33,6 +36,7 @@ urlpatterns = [
     path('api/dashboard/daily-active-users/', views.api_daily_active_users, name='api_daily_active_users'),
     path('api/dashboard/tests-completed/', views.api_tests_completed, name='api_tests_completed'),
     path('api/dashboard/top-band-scores/', views.api_top_band_scores, name='api_top_band_scores'),
+    path('api/leaderboard/rank/', views.api_leaderboard_rank, name='api_leaderboard_rank'),
     
     path('api/users/', views.api_users_list, name='api_users_list'),
     path('api/users/<int:user_id>/', views.api_user_detail, name='api_user_detail'),
@@ -44,11 +48,13 @@ urlpatterns = [
     
     path('api/admin/payments/', views.api_admin_payments, name='api_admin_payments'),
     path('api/admin/pricing-settings/', views.api_pricing_settings, name='api_pricing_settings'),
+    path('api/admin/cache-stats/', views.api_cache_stats, name='api_cache_stats'),
     
     path('api/pricing/', views.api_pricing, name='api_pricing'),
     
     path('api/tests/', views.api_tests_list, name='api_tests_list'),
     path('api/tests/create/', views.api_test_create, name='api_test_create'),
+    path('api/tests/images/', views.api_test_image_upload, name='api_test_image_upload'),
     path('api/tests/<int:test_id>/', views.api_test_detail, name='api_test_detail'),
     path('api/tests/<int:test_id>/delete/', views.api_test_delete, name='api_test_delete'),
     
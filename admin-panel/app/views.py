@@ -1,19 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.urls import reverse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import Count, Avg, Sum, Q
-from django.db.models.functions import TruncDate
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Avg, Sum, Q, F, FloatField
+from django.db.models.functions import TruncDate, Coalesce, Greatest
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.conf import settings as django_settings
+from datetime import date, datetime, timedelta
+import csv
+import hashlib
+import io
 import json
+import logging
 import random
 # space
-from .models import User, Test, TestResult, DailyStats, Question, ExamSession, ExamAnswer, Payment, PricingSettings
+from .models import User, Test, TestResult, ExamSession, ExamAnswer, Payment, PricingSettings, UserExamStats
+from . import exam_timer, media_store, pagination, payments, rollups, timeseries
+from .caching import cached_view
+from .distribution import distribution
+from .exam_cache import answer_keys, module_payloads
+from .leaderboard import leaderboard
+from .replicas import replica_view
+
+logger = logging.getLogger(__name__)
 # space
 # space
 def home_page(request):
@@ -117,54 +135,62 @@ def logout_view(request):
 @login_required
 def user_dashboard(request):
     user = request.user
-    recent_results = ExamSession.objects.filter(user=user, status='completed').order_by('-completed_at')[:5]
+    stats = get_exam_stats(user)
     
-    total_time = sum([
-        exam.time_spent for exam in ExamSession.objects.filter(user=user, status='completed')
-    ])
-    total_minutes = total_time // 60
+    total_minutes = stats.total_time_spent // 60
     hours = total_minutes // 60
     mins = total_minutes % 60
     total_time_display = f"{hours}h {mins}m"
     
     return render(request, 'main/dashboard.html', {
         'user': user,
-        'recent_results': recent_results,
+        'recent_results': recent_exams(stats)[:5],
         'total_time_display': total_time_display
     })
 
 
+def get_exam_stats(user):
+    """The user's exam summary; an unsaved empty one if they never finished an exam"""
+    try:
+        return user.exam_stats
+    except UserExamStats.DoesNotExist:
+        return UserExamStats(user=user)
+
+
+def recent_exams(stats):
+    """Stored score points with `completed_at` parsed back into datetimes"""
+    return [
+        dict(point, completed_at=datetime.fromisoformat(point['completed_at']) if point['completed_at'] else None)
+        for point in stats.recent_scores
+    ]
+
+
 @login_required
 def user_progress(request):
     user = request.user
-    exam_sessions = ExamSession.objects.filter(user=user, status='completed').order_by('-completed_at')
+    stats = get_exam_stats(user)
     
-    if not exam_sessions.exists():
+    if not stats.exams_completed:
         return render(request, 'main/progress.html', {
             'no_results': True,
             'user': user
         })
     
-    scores_data = []
-    for exam in exam_sessions[:10]:
-        scores_data.append({
-            'date': exam.completed_at.strftime('%b %d'),
-            'total': exam.total_score,
-            'english': exam.english_score,
-            'math': exam.math_score
-        })
-    
-    avg_score = exam_sessions.aggregate(avg=Avg('total_score'))['avg'] or 0
-    best_score = user.best_score
-    total_tests = exam_sessions.count()
+    exams = recent_exams(stats)
+    scores_data = [{
+        'date': timezone.localtime(exam['completed_at']).strftime('%b %d') if exam['completed_at'] else '',
+        'total': exam['total'],
+        'english': exam['english'],
+        'math': exam['math']
+    } for exam in exams]
     
     return render(request, 'main/progress.html', {
         'user': user,
-        'exam_sessions': exam_sessions,
+        'exam_sessions': exams,
         'scores_data': json.dumps(list(reversed(scores_data))),
-        'avg_score': round(avg_score),
-        'best_score': best_score,
-        'total_tests': total_tests,
+        'avg_score': stats.avg_score,
+        'best_score': user.best_score,
+        'total_tests': stats.exams_completed,
         'no_results': False
     })
 
@@ -212,71 +238,61 @@ def update_avatar(request):
 
 @login_required
 def start_exam(request):
-    session = ExamSession.objects.filter(user=request.user, status='in_progress').first()
+    session = ExamSession.objects.filter(user=request.user, status__in=['in_progress', 'break']).first()
     
     if not session:
         session = ExamSession.objects.create(user=request.user)
+    elif session.status == 'break':
+        # Reloading during the break resumes with the math section
+        session.status = 'in_progress'
+        session.save(update_fields=['status'])
     
-    if session.current_section == 'english':
-        questions = list(Question.objects.filter(
-            category='english',
-            module=session.current_module
-        ).values('id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d'))
-        time_remaining = 32 * 60
-    else:
-        questions = list(Question.objects.filter(
-            category='math',
-            module=session.current_module
-        ).values('id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d'))
-        time_remaining = 35 * 60
-    
-    if not questions:
-        questions = generate_sample_questions(session.current_section, session.current_module)
+    if exam_timer.is_expired(session.module_deadline):
+        if finish_module(session) == 'results':
+            return redirect('exam_result', session_id=session.id)
+        return redirect('start_exam')
     
-    existing_answers = ExamAnswer.objects.filter(exam_session=session).values_list('question_id', 'selected_answer')
-    answer_dict = {str(q_id): ans for q_id, ans in existing_answers}
+    payload = module_payloads.get(session.current_section, session.current_module)
+    if not payload['ids']:
+        # Question banks are provisioned ahead of time (manage.py provision_question_bank)
+        logger.error("No questions for %s module %s", session.current_section, session.current_module)
+        messages.error(request, "Imtihon savollari hozircha mavjud emas. Iltimos, keyinroq urinib ko'ring.")
+        return redirect('user_dashboard')
     
-    answers = [answer_dict.get(str(q['id']), None) for q in questions]
+    # The module clock starts the first time its questions are served
+    exam_timer.start_module(session)
+    time_remaining = exam_timer.remaining(session.module_deadline)
+    
+    answer_dict = dict(ExamAnswer.objects.filter(
+        exam_session=session, question_id__in=payload['ids']
+    ).values_list('question_id', 'selected_answer'))
+    answers = json.dumps([answer_dict.get(q_id) for q_id in payload['ids']])
+    
+    # The page only changes with the module content, the deadline, the saved answers
+    # and the CSRF cookie; the countdown itself is computed from the deadline client-side
+    etag = hashlib.sha1(':'.join([
+        payload['etag'], str(session.id), session.current_section, str(session.current_module),
+        session.module_deadline.isoformat(), answers, request.COOKIES.get(django_settings.CSRF_COOKIE_NAME, '')
+    ]).encode()).hexdigest()
+    etag = quote_etag(etag)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
     
     section_title = f"{session.current_section.title()} Module {session.current_module}"
     
-    return render(request, 'main/exam.html', {
+    response = render(request, 'main/exam.html', {
         'exam_session': session,
-        'questions': json.dumps(questions),
-        'answers': json.dumps(answers),
+        'questions': payload['json'],
+        'answers': answers,
         'time_remaining': time_remaining,
+        'deadline_ms': int(session.module_deadline.timestamp() * 1000),
         'section_title': section_title
     })
-
-
-def generate_sample_questions(category, module):
-    questions = []
-    num_questions = 27 if category == 'english' else 22
-    
-    for i in range(1, num_questions + 1):
-        q, created = Question.objects.get_or_create(
-            category=category,
-            module=module,
-            question_number=i,
-            defaults={
-                'question_text': f'Sample {category.title()} Question {i}: Which of the following best describes the main idea?',
-                'option_a': 'The author argues for environmental protection',
-                'option_b': 'The passage discusses historical events',
-                'option_c': "Technology's impact on society",
-                'option_d': 'Economic development strategies',
-                'correct_answer': random.choice(['A', 'B', 'C', 'D'])
-            }
-        )
-        questions.append({
-            'id': q.id,
-            'question_text': q.question_text,
-            'option_a': q.option_a,
-            'option_b': q.option_b,
-            'option_c': q.option_c,
-            'option_d': q.option_d
-        })
-    
-    return questions
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @csrf_exempt
@@ -289,33 +305,133 @@ def api_save_answer(request):
         answer = data.get('answer')
         
         session = get_object_or_404(ExamSession, id=session_id, user=request.user)
-        question = get_object_or_404(Question, id=question_id)
+        if exam_timer.is_expired(session.module_deadline):
+            return module_expired_response()
+        saved = save_exam_answers(session, [(question_id, answer)])
+        if not saved:
+            return JsonResponse({'success': False, 'error': 'Question not found'}, status=404)
         
-        exam_answer, created = ExamAnswer.objects.update_or_create(
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': False})
+
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def api_save_answers(request):
+    """Save a batch of {question_id, answer} pairs in one upsert"""
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data.get('answers'), list):
+            raise TypeError('answers must be a list')
+        pairs = [(int(item['question_id']), item.get('answer')) for item in data['answers']]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid payload'}, status=400)
+    
+    if len(pairs) > MAX_ANSWER_BATCH:
+        return JsonResponse({'success': False, 'error': f'At most {MAX_ANSWER_BATCH} answers per request'}, status=400)
+    
+    session = get_object_or_404(ExamSession, id=data.get('session_id'), user=request.user)
+    if exam_timer.is_expired(session.module_deadline):
+        return module_expired_response()
+    saved = save_exam_answers(session, pairs)
+    return JsonResponse({'success': True, 'saved': saved})
+
+
+MAX_ANSWER_BATCH = 100
+
+
+def module_expired_response():
+    return JsonResponse({'success': False, 'error': 'Time is up for this module', 'expired': True}, status=409)
+
+
+def save_exam_answers(session, pairs):
+    """
+    Upsert answers for one session with a single INSERT ... ON CONFLICT and
+    move the current module's running correct count by the change in
+    correct answers. Later pairs for the same question win; unknown
+    questions and invalid answers are skipped. Returns the number of
+    answers saved.
+    """
+    answers = {}
+    for question_id, answer in pairs:
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            continue
+        if answer in ('', None):
+            answer = None
+        elif not isinstance(answer, str) or len(answer) != 1:
+            continue
+        answers[question_id] = answer
+    
+    answer_key = answer_keys.get(session.current_section, session.current_module)
+    correct_answers = answer_keys.correct_answers(session.current_section, session.current_module, list(answers))
+    rows = [
+        ExamAnswer(
+            exam_session=session,
+            question_id=question_id,
+            selected_answer=answer,
+            is_correct=answer is not None and answer == correct_answers[question_id]
+        )
+        for question_id, answer in answers.items() if question_id in correct_answers
+    ]
+    if not rows:
+        return 0
+    
+    scored = [row for row in rows if row.question_id in answer_key]
+    
+    with transaction.atomic():
+        # Lock the session so concurrent batches can't both apply the same delta
+        ExamSession.objects.select_for_update().filter(pk=session.pk).values_list('pk').first()
+        previously_correct = ExamAnswer.objects.filter(
             exam_session=session,
-            question=question,
-            defaults={
-                'selected_answer': answer,
-                'is_correct': answer == question.correct_answer
-            }
+            question_id__in=[row.question_id for row in scored],
+            is_correct=True
+        ).count() if scored else 0
+        
+        ExamAnswer.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['exam_session', 'question'],
+            update_fields=['selected_answer', 'is_correct', 'answered_at']
         )
         
-        return JsonResponse({'success': True})
-    return JsonResponse({'success': False})
+        delta = sum(1 for row in scored if row.is_correct) - previously_correct
+        if delta:
+            field = session.module_score_field
+            ExamSession.objects.filter(pk=session.pk).update(**{field: F(field) + delta})
+    return len(rows)
 
 
 @csrf_exempt
 @login_required
+@require_http_methods(["POST"])
 def api_save_time(request):
-    if request.method == 'POST':
+    """
+    Exam page heartbeat. Answers with the server's remaining time for the
+    current module; served from the cache, the database only sees a coarse
+    last_heartbeat_at write.
+    """
+    try:
         data = json.loads(request.body)
-        session_id = data.get('session_id')
-        time_spent = data.get('time_spent', 0)
-        session = get_object_or_404(ExamSession, id=session_id, user=request.user)
-        session.time_spent = time_spent
-        session.save(update_fields=['time_spent'])
-        return JsonResponse({'success': True})
-    return JsonResponse({'success': False})
+        session_id = int(data.get('session_id'))
+        module = int(data['module']) if data.get('module') is not None else None
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid payload'}, status=400)
+    
+    timer = exam_timer.get_timer(session_id, data.get('section'), module)
+    if timer is None or timer['user_id'] != request.user.id:
+        return JsonResponse({'success': False, 'error': 'Session not found'}, status=404)
+    
+    exam_timer.heartbeat(session_id)
+    return JsonResponse({
+        'success': True,
+        'section': timer['section'],
+        'module': timer['module'],
+        'time_remaining': exam_timer.remaining(timer['deadline']),
+        'expired': exam_timer.is_expired(timer['deadline']),
+    })
 
 
 @csrf_exempt
@@ -325,75 +441,72 @@ def api_finish_section(request):
         data = json.loads(request.body)
         session_id = data.get('session_id')
         session = get_object_or_404(ExamSession, id=session_id, user=request.user)
+        next_action = finish_module(session, data.get('section'), data.get('module'))
+        return JsonResponse({'next_action': next_action})
+    
+    return JsonResponse({'success': False})
+
+
+def finish_module(session, section=None, module=None):
+    """
+    End the session's current module and move to the next one, the break or
+    the results. `section`/`module` name the module the client is finishing;
+    if it was already finished (e.g. by timer expiry), nothing moves again.
+    Returns the client's next action.
+    """
+    with transaction.atomic():
+        session = ExamSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == 'completed':
+            return 'results'
+        if session.status == 'break':
+            return 'break'
+        if section and (section != session.current_section or str(module) != str(session.current_module)):
+            return 'next_module'
         
-        # Calculate time spent properly
-        if session.started_at:
-            time_spent = (timezone.now() - session.started_at).total_seconds()
-            session.time_spent = int(time_spent)
+        exam_timer.end_module(session)
+        timing_fields = ['time_spent'] + exam_timer.TIMER_FIELDS
         
-        correct_count = ExamAnswer.objects.filter(
-            exam_session=session,
-            question__category=session.current_section,
-            question__module=session.current_module,
-            is_correct=True
-        ).count()
+        # Module scores are kept up to date by save_exam_answers
+        if session.current_module == 1:
+            session.current_module = 2
+            session.save(update_fields=timing_fields + ['current_module'])
+            return 'next_module'
         
         if session.current_section == 'english':
-            if session.current_module == 1:
-                session.english_module1_score = correct_count
-                session.current_module = 2
-                session.save()
-                return JsonResponse({'next_action': 'next_module'})
-            else:
-                session.english_module2_score = correct_count
-                session.english_score = calculate_section_score(
-                    session.english_module1_score + session.english_module2_score, 54
-                )
-                session.current_section = 'math'
-                session.current_module = 1
-                session.status = 'break'
-                session.save()
-                return JsonResponse({'next_action': 'break'})
-        else:
-            if session.current_module == 1:
-                session.math_module1_score = correct_count
-                session.current_module = 2
-                session.save()
-                return JsonResponse({'next_action': 'next_module'})
-            else:
-                session.math_module2_score = correct_count
-                session.math_score = calculate_section_score(
-                    session.math_module1_score + session.math_module2_score, 44
-                )
-                session.total_score = session.english_score + session.math_score
-                session.status = 'completed'
-                session.completed_at = timezone.now()
-                
-                if session.started_at and session.completed_at:
-                    duration = session.completed_at - session.started_at
-                    session.time_spent = int(duration.total_seconds())
-                
-                session.save()
-                
-                user = request.user
-                user.tests_completed += 1
-                if session.total_score > user.best_score:
-                    user.best_score = session.total_score
-                
-                total_time = sum([
-                    exam.time_spent for exam in ExamSession.objects.filter(user=user, status='completed')
-                ])
-                user.total_time_spent = total_time // 60
-                user.save()
-                
-                today = timezone.now().date()
-                daily_stat, created = DailyStats.objects.get_or_create(date=today)
-                daily_stat.tests_completed += 1
-                daily_stat.save()
-                
-                return JsonResponse({'next_action': 'results'})
+            session.english_score = calculate_section_score(
+                session.english_module1_score + session.english_module2_score, 54
+            )
+            session.current_section = 'math'
+            session.current_module = 1
+            session.status = 'break'
+            session.save(update_fields=timing_fields + ['english_score', 'current_section', 'current_module', 'status'])
+            return 'break'
+        
+        session.math_score = calculate_section_score(
+            session.math_module1_score + session.math_module2_score, 44
+        )
+        session.total_score = session.english_score + session.math_score
+        session.status = 'completed'
+        session.completed_at = timezone.now()
+        session.save(update_fields=timing_fields + [
+            'math_score', 'total_score', 'status', 'completed_at', 'certificate_id'
+        ])
+        
+        stats = UserExamStats.record(session)
+        # Minutes of the exact total in seconds, not a sum of per-exam roundings
+        User.objects.filter(pk=session.user_id).update(
+            tests_completed=F('tests_completed') + 1,
+            best_score=Greatest('best_score', session.total_score),
+            total_time_spent=stats.total_time_spent // 60,
+            last_active=timezone.now()
+        )
+        distribution.record(session)
+        transaction.on_commit(
+            lambda: leaderboard.record_score(session.user_id, session.total_score)
+        )
+        transaction.on_commit(lambda: distribution.add(session))
     
-    return JsonResponse({'success': False})
+    return 'results'
 
 
 def calculate_section_score(correct, total):
@@ -436,21 +549,9 @@ def exam_result(request, session_id):
     writing_score = round(10 + (english_correct / 54) * 30)
     math_test_score = round(10 + (math_correct / 44) * 30)
     
-    if exam.total_score >= 1550:
-        english_percentile = 99
-        user_percentile = 99
-    elif exam.total_score >= 1400:
-        english_percentile = 95
-        user_percentile = 94
-    elif exam.total_score >= 1200:
-        english_percentile = 80
-        user_percentile = 78
-    elif exam.total_score >= 1000:
-        english_percentile = 55
-        user_percentile = 52
-    else:
-        english_percentile = 30
-        user_percentile = 28
+    english_percentile = distribution.percentile('english', exam.english_score)
+    math_percentile = distribution.percentile('math', exam.math_score)
+    total_percentile = distribution.percentile('total', exam.total_score)
     
     return render(request, 'main/result.html', {
         'exam': exam,
@@ -460,7 +561,8 @@ def exam_result(request, session_id):
         'writing_score': writing_score,
         'math_test_score': math_test_score,
         'english_percentile': english_percentile,
-        'user_percentile': user_percentile
+        'math_percentile': math_percentile,
+        'total_percentile': total_percentile
     })
 
 
@@ -491,14 +593,16 @@ def settings_page(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@cached_view('dashboard_stats', timeout=60)
+@replica_view
 def api_dashboard_stats(request):
     total_users = User.objects.filter(is_staff=False).count()
-    today = timezone.now().date()
+    today = timezone.localdate()
     week_ago = today - timedelta(days=7)
     
-    new_signups = User.objects.filter(is_staff=False, created_at__date__gte=week_ago).count()
-    dau = User.objects.filter(is_staff=False, last_active__date=today).count()
-    total_tests = ExamSession.objects.filter(status='completed').count()
+    new_signups = sum(rollups.daily_values('new_signups', week_ago, today).values())
+    dau = rollups.daily_values('active_users', today, today)[today]
+    total_tests = rollups.total('tests_completed')
     
     return JsonResponse({
         'total_users': total_users,
@@ -510,87 +614,105 @@ def api_dashboard_stats(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_view
 def api_daily_active_users(request):
-    days = request.GET.get('days', '7')
-    end_date = timezone.now().date()
-    
-    if days == 'all':
-        start_date = User.objects.filter(is_staff=False).order_by('created_at').first()
-        if start_date:
-            start_date = start_date.created_at.date()
-        else:
-            start_date = end_date - timedelta(days=30)
-    else:
-        days = int(days)
-        start_date = end_date - timedelta(days=days-1)
-    
-    data = []
-    current_date = start_date
-    while current_date <= end_date:
-        active_count = User.objects.filter(
-            is_staff=False,
-            last_active__date=current_date
-        ).count()
-        data.append({
-            'date': current_date.strftime('%b %d'),
-            'active_users': active_count
-        })
-        current_date += timedelta(days=1)
-    
-    return JsonResponse({'data': data})
+    return chart_response(request, 'active_users')
 
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_view
 def api_tests_completed(request):
-    days = request.GET.get('days', '7')
-    end_date = timezone.now().date()
-    
-    if days == 'all':
-        first_session = ExamSession.objects.filter(status='completed').order_by('completed_at').first()
-        if first_session and first_session.completed_at:
-            start_date = first_session.completed_at.date()
-        else:
-            start_date = end_date - timedelta(days=30)
-    else:
-        days = int(days)
-        start_date = end_date - timedelta(days=days-1)
-    
-    data = []
-    current_date = start_date
-    while current_date <= end_date:
-        tests_count = ExamSession.objects.filter(
-            status='completed',
-            completed_at__date=current_date
-        ).count()
-        data.append({
-            'date': current_date.strftime('%b %d'),
-            'tests_completed': tests_count
-        })
-        current_date += timedelta(days=1)
+    return chart_response(request, 'tests_completed')
+
+
+def chart_response(request, metric):
+    queryset, field = rollups.metric_source(metric)
+    granularity = request.GET.get('granularity', 'day')
+    try:
+        tzinfo = timeseries.resolve_timezone(request.GET.get('tz'))
+        start_date, end_date = timeseries.resolve_range(
+            request.GET.get('days', '7'), queryset, field, tzinfo
+        )
+        series = rollups.series(metric, start_date, end_date, granularity, tzinfo)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    return JsonResponse({'data': data})
+    return JsonResponse({'data': timeseries.format_series(series, metric, granularity)})
 
 
 @csrf_exempt
 @require_http_methods(["GET"])
+# Short: other workers' leaderboards catch up within LEADERBOARD_CHECK_INTERVAL
+@cached_view('leaderboard', timeout=30)
 def api_top_band_scores(request):
-    limit = int(request.GET.get('limit', 10))
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_LEADERBOARD_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
     
-    users = User.objects.filter(best_score__gt=0).order_by('-best_score')[:limit]
+    top = leaderboard.top(limit)
+    users = User.objects.in_bulk([user_id for user_id, score in top])
     
-    data = [{
-        'rank': i,
-        'name': f"{user.first_name} {user.last_name}".strip() or user.username,
-        'band_score': user.best_score,
-        'tests_completed': user.tests_completed
-    } for i, user in enumerate(users, 1)]
+    data = []
+    for position, (user_id, score) in enumerate(top, 1):
+        user = users.get(user_id)
+        if user is None:
+            continue
+        data.append({
+            # Tied scores share a rank
+            'rank': data[-1]['rank'] if data and data[-1]['band_score'] == score else position,
+            'name': leaderboard_name(user),
+            'band_score': score,
+            'tests_completed': user.tests_completed
+        })
     
     return JsonResponse({'data': data})
 
 
+MAX_LEADERBOARD_LIMIT = 100
+
+
+def leaderboard_name(user):
+    return f"{user.first_name} {user.last_name}".strip() or user.username
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_leaderboard_rank(request):
+    """Rank, percentile and neighbors of the current user (staff may pass ?user_id=)"""
+    user_id = request.user.id
+    if request.GET.get('user_id') and request.user.is_staff:
+        try:
+            user_id = int(request.GET['user_id'])
+        except ValueError:
+            return JsonResponse({'error': 'user_id must be a number'}, status=400)
+    try:
+        around = min(max(int(request.GET.get('around', 2)), 0), 10)
+    except ValueError:
+        return JsonResponse({'error': 'around must be a number'}, status=400)
+    
+    position = leaderboard.position(user_id)
+    if position is None:
+        return JsonResponse({'ranked': False, 'total': leaderboard.size()})
+    
+    nearby = leaderboard.neighbors(user_id, around)
+    users = User.objects.only('first_name', 'last_name', 'username').in_bulk([entry[1] for entry in nearby])
+    return JsonResponse({
+        'ranked': True,
+        **position,
+        'neighbors': [{
+            'position': index,
+            'name': leaderboard_name(users[neighbor_id]) if neighbor_id in users else '',
+            'band_score': score,
+            'is_you': neighbor_id == user_id,
+        } for index, neighbor_id, score in nearby],
+    })
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
+@cached_view('pricing', timeout=3600)
 def api_pricing(request):
     """Get current pricing for admin panel"""
     settings = PricingSettings.get_settings()
@@ -602,15 +724,67 @@ def api_pricing(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_view
 def api_admin_users(request):
-    """Get all users with detailed stats for admin panel"""
-    users = User.objects.filter(is_staff=False).select_related().annotate(
-        total_tests_taken=Count('exam_sessions', filter=Q(exam_sessions__status='completed')),
-        avg_band_score=Avg('exam_sessions__total_score', filter=Q(exam_sessions__status='completed'))
-    ).order_by('-created_at')
+    """Keyset-paginated users list with server-side search, filters and sorting"""
+    sort_fields = ADMIN_USER_SORTS.get(request.GET.get('sort', 'date'))
+    if not sort_fields:
+        return JsonResponse({'error': 'sort must be one of: ' + ', '.join(ADMIN_USER_SORTS)}, status=400)
+    
+    users = User.objects.filter(is_staff=False)
+    
+    search = request.GET.get('search', '').strip()
+    if search:
+        users = users.filter(
+            Q(first_name__icontains=search) |
+            Q(last_name__icontains=search) |
+            Q(email__icontains=search) |
+            Q(phone__icontains=search) |
+            Q(username__icontains=search)
+        )
+    
+    status_filter = request.GET.get('status', '')
+    if status_filter:
+        users = users.filter(status=status_filter)
+    
+    subscription_filter = request.GET.get('subscription', '')
+    if subscription_filter == 'active':
+        users = users.filter(subscription='premium')
+    elif subscription_filter == 'inactive':
+        users = users.exclude(subscription='premium')
+    elif subscription_filter:
+        users = users.filter(subscription=subscription_filter)
+    
+    filtered = users
+    completed = Q(exam_sessions__status='completed')
+    if 'total_tests_taken' in sort_fields:
+        users = users.annotate(total_tests_taken=Count('exam_sessions', filter=completed))
+    elif 'avg_band_score' in sort_fields:
+        users = users.annotate(avg_band_score=Coalesce(
+            Avg('exam_sessions__total_score', filter=completed), 0.0, output_field=FloatField()
+        ))
+    
+    try:
+        limit = pagination.parse_limit(request.GET.get('limit'))
+        page, next_cursor = pagination.paginate(
+            users.values('id', *sort_fields),
+            sort_fields,
+            cursor=request.GET.get('cursor'),
+            limit=limit,
+            to_python=parse_created_at_cursor if sort_fields[0] == 'created_at' else None
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    ids = [row['id'] for row in page]
+    page_users = User.objects.filter(id__in=ids).annotate(
+        total_tests_taken=Count('exam_sessions', filter=completed),
+        avg_band_score=Avg('exam_sessions__total_score', filter=completed)
+    ).in_bulk()
     
     users_data = []
-    for user in users:
+    for user_id in ids:
+        user = page_users[user_id]
         full_name = f"{user.first_name} {user.last_name}".strip() or 'No name'
         has_active_subscription = user.subscription == 'premium'
         
@@ -626,7 +800,21 @@ def api_admin_users(request):
             'last_login': user.last_login.isoformat() if user.last_login else None,
         })
     
-    return JsonResponse({'users': users_data})
+    response = {'users': users_data, 'next_cursor': next_cursor}
+    if not request.GET.get('cursor'):
+        response['total'], response['total_is_estimate'] = pagination.estimate_count(filtered)
+    return JsonResponse(response)
+
+
+ADMIN_USER_SORTS = {
+    'date': ('created_at', 'id'),
+    'band': ('avg_band_score', 'id'),
+    'tests': ('total_tests_taken', 'id'),
+}
+
+
+def parse_created_at_cursor(values):
+    return [datetime.fromisoformat(values[0]), int(values[1])]
 
 
 @csrf_exempt
@@ -744,34 +932,69 @@ def api_user_delete(request, user_id):
 @csrf_exempt
 @require_http_methods(["GET"])
 def api_tests_list(request):
+    """
+    Tests with their completion stats in one query. `fields=` picks the
+    returned keys; `limit`/`cursor` switch on keyset pagination.
+    """
     category = request.GET.get('category', 'all')
     
+    fields = [f for f in request.GET.get('fields', '').split(',') if f] or list(TEST_LIST_FIELDS)
+    unknown = [f for f in fields if f not in TEST_LIST_FIELDS]
+    if unknown:
+        return JsonResponse({'error': 'Unknown fields: ' + ', '.join(unknown)}, status=400)
+    
     tests = Test.objects.all()
     
     if category != 'all':
         tests = tests.filter(category=category)
     
-    data = []
-    for test in tests:
-        completions = TestResult.objects.filter(test=test).count()
-        avg_score = TestResult.objects.filter(test=test).aggregate(avg=Avg('score'))['avg']
-        
-        data.append({
-            'id': test.id,
-            'title': test.title,
-            'description': test.description,
-            'category': test.category,
-            'test_type': test.test_type,
-            'difficulty': test.difficulty,
-            'duration': test.duration,
-            'questions_count': test.questions_count,
-            'is_active': test.is_active,
-            'completions': completions,
-            'avg_score': round(avg_score, 1) if avg_score else 0,
-            'created_at': test.created_at.strftime('%Y-%m-%d'),
-        })
+    # Never select test_questions here; it can be large
+    tests = tests.values('id', 'created_at', *[f for f in fields if f not in TEST_LIST_AGGREGATES])
+    for field in fields:
+        if field in TEST_LIST_AGGREGATES:
+            tests = tests.annotate(**{field: TEST_LIST_AGGREGATES[field]})
     
-    return JsonResponse({'data': data})
+    next_cursor = None
+    if 'limit' in request.GET or 'cursor' in request.GET:
+        try:
+            rows, next_cursor = pagination.paginate(
+                tests,
+                ('created_at', 'id'),
+                cursor=request.GET.get('cursor'),
+                limit=pagination.parse_limit(request.GET.get('limit')),
+                to_python=parse_created_at_cursor
+            )
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        rows = tests.order_by('-created_at', '-id')
+    
+    data = [serialize_test_row(row, fields) for row in rows]
+    
+    response = {'data': data}
+    if next_cursor or 'cursor' in request.GET or 'limit' in request.GET:
+        response['next_cursor'] = next_cursor
+    return JsonResponse(response)
+
+
+TEST_LIST_FIELDS = (
+    'id', 'title', 'description', 'category', 'test_type', 'difficulty', 'duration',
+    'questions_count', 'is_active', 'completions', 'avg_score', 'created_at',
+)
+
+TEST_LIST_AGGREGATES = {
+    'completions': Count('results'),
+    'avg_score': Avg('results__score'),
+}
+
+
+def serialize_test_row(row, fields):
+    data = {field: row[field] for field in fields}
+    if 'avg_score' in data:
+        data['avg_score'] = round(data['avg_score'], 1) if data['avg_score'] else 0
+    if 'created_at' in data:
+        data['created_at'] = data['created_at'].strftime('%Y-%m-%d')
+    return data
 
 
 @csrf_exempt
@@ -779,6 +1002,11 @@ def api_tests_list(request):
 def api_test_create(request):
     data = json.loads(request.body)
     
+    try:
+        questions, _ = media_store.externalize_images(data.get('questions', []))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
     test = Test.objects.create(
         title=data['title'],
         description=data.get('description', ''),
@@ -787,13 +1015,30 @@ def api_test_create(request):
         difficulty=data.get('difficulty', 'medium'),
         duration=data['duration'],
         questions_count=data.get('questions_count', 0),
-        test_questions=data.get('questions', []),
+        test_questions=questions,
         is_active=data.get('is_active', True),
     )
     
     return JsonResponse({'success': True, 'id': test.id})
 
 
+@csrf_exempt
+@staff_member_required(login_url='/django-admin/login/')
+@require_http_methods(["POST"])
+def api_test_image_upload(request):
+    """Store a question image and return its URL for the test's question JSON"""
+    image = request.FILES.get('image')
+    if not image:
+        return JsonResponse({'error': 'No image uploaded'}, status=400)
+    if image.size > media_store.max_image_bytes():
+        return JsonResponse({'error': 'Image is too large'}, status=400)
+    try:
+        url = media_store.store_image(image.read())
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'url': url})
+
+
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def api_test_detail(request, test_id):
@@ -833,6 +1078,7 @@ def api_test_delete(request, test_id):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_view
 def api_results_list(request):
     user_id = request.GET.get('user_id')
     test_id = request.GET.get('test_id')
@@ -885,30 +1131,46 @@ def payment_page(request):
             user=request.user,
             payment_method=payment_method,
             amount=settings.exam_price,
-            status='processing' if float(settings.exam_price) > 0 else 'completed',
+            status='pending' if float(settings.exam_price) > 0 else 'completed',
             card_number=card_number[-4:],
             card_expiry=card_expiry,
-            payment_type='exam'
+            payment_type='exam',
+            completed_at=None if float(settings.exam_price) > 0 else timezone.now()
         )
         
-        # Process payment only if amount > 0
-        if float(settings.exam_price) > 0:
-            import time
-            time.sleep(2)
-            
-            payment.status = 'completed'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            messages.success(request, f"✅ To'lovni muvaffaqiyatli amalga oshirdingiz! Transaction ID: {payment.transaction_id}")
-        else:
-            payment.completed_at = timezone.now()
-            payment.save()
+        if payment.status == 'completed':
             messages.success(request, f"✅ Karta ma'lumotlaringiz saqlandi! Transaction ID: {payment.transaction_id}")
+            return redirect('start_exam')
         
-        return redirect('start_exam')
+        # The gateway call runs in the background; the page polls api_payment_status
+        payments.submit(payment)
+        return redirect(f"{reverse('payment_page')}?payment={payment.transaction_id}")
+    
+    pending_payment = None
+    if request.GET.get('payment'):
+        pending_payment = Payment.objects.filter(
+            user=request.user, transaction_id=request.GET['payment']
+        ).only('transaction_id', 'status').first()
     
-    return render(request, 'main/payment.html', {'settings': settings})
+    return render(request, 'main/payment.html', {'settings': settings, 'pending_payment': pending_payment})
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_payment_status(request, transaction_id):
+    payment = Payment.objects.filter(
+        user=request.user, transaction_id=transaction_id
+    ).values('transaction_id', 'status').first()
+    if not payment:
+        return JsonResponse({'error': 'Payment not found'}, status=404)
+    
+    response = {'transaction_id': payment['transaction_id'], 'status': payment['status']}
+    if payment['status'] == 'completed':
+        messages.success(request, f"✅ To'lovni muvaffaqiyatli amalga oshirdingiz! Transaction ID: {payment['transaction_id']}")
+        response['redirect'] = reverse('start_exam')
+    elif payment['status'] == 'failed':
+        response['message'] = "To'lov amalga oshmadi. Karta ma'lumotlarini tekshirib, qaytadan urinib ko'ring."
+    return JsonResponse(response)
 
 
 @staff_member_required(login_url='/django-admin/login/')
@@ -918,38 +1180,140 @@ def admin_payments(request):
 
 @csrf_exempt
 @staff_member_required(login_url='/django-admin/login/')
+@replica_view
 def api_admin_payments(request):
-    from decimal import Decimal
-    from django.db import models as db_models
-    
-    payments = Payment.objects.select_related('user').all().order_by('-created_at')
-    
-    total_revenue = Payment.objects.filter(status='completed').aggregate(
-        total=db_models.Sum('amount')
-    )['total'] or Decimal('0')
-    
-    exam_count = Payment.objects.filter(payment_type='exam', status='completed').count()
-    subscription_count = Payment.objects.filter(payment_type='subscription', status='completed').count()
-    
-    payments_data = []
-    for payment in payments:
-        payments_data.append({
-            'id': payment.id,
-            'transaction_id': payment.transaction_id,
-            'user_name': payment.user.get_full_name() or payment.user.username,
-            'user_email': payment.user.email,
-            'payment_type': payment.payment_type,
-            'amount': str(payment.amount),
-            'payment_method': payment.payment_method,
-            'status': payment.status,
-            'created_at': payment.created_at.isoformat(),
+    """Keyset-paginated payments ledger; ?format=csv streams the whole filtered ledger"""
+    ledger = Payment.objects.all()
+    
+    for param, field in (('type', 'payment_type'), ('status', 'status'), ('method', 'payment_method')):
+        if request.GET.get(param):
+            ledger = ledger.filter(**{field: request.GET[param]})
+    
+    # Plain range bounds on created_at, so payments_created_id_idx can limit the scan
+    try:
+        if request.GET.get('date_from'):
+            ledger = ledger.filter(created_at__gte=timeseries.local_midnight(date.fromisoformat(request.GET['date_from'])))
+        if request.GET.get('date_to'):
+            day_after = date.fromisoformat(request.GET['date_to']) + timedelta(days=1)
+            ledger = ledger.filter(created_at__lt=timeseries.local_midnight(day_after))
+    except ValueError:
+        return JsonResponse({'error': 'date_from and date_to must be YYYY-MM-DD'}, status=400)
+    
+    rows = ledger.values(*PAYMENT_LEDGER_FIELDS)
+    
+    if request.GET.get('format') == 'csv':
+        response = StreamingHttpResponse(
+            stream_payments_csv(rows.order_by('-created_at', '-id').iterator(chunk_size=2000)),
+            content_type='text/csv'
+        )
+        response['Content-Disposition'] = 'attachment; filename="payments.csv"'
+        return response
+    
+    try:
+        page, next_cursor = pagination.paginate(
+            rows,
+            ('created_at', 'id'),
+            cursor=request.GET.get('cursor'),
+            limit=pagination.parse_limit(request.GET.get('limit')),
+            to_python=parse_created_at_cursor
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    response = {
+        'payments': [serialize_payment(row) for row in page],
+        'next_cursor': next_cursor,
+    }
+    
+    if not request.GET.get('cursor'):
+        # Served entirely from payments_status_type_idx
+        totals = Payment.objects.filter(status='completed').aggregate(
+            total_revenue=Sum('amount'),
+            exam_count=Count('id', filter=Q(payment_type='exam')),
+            subscription_count=Count('id', filter=Q(payment_type='subscription')),
+        )
+        response.update({
+            'total_revenue': float(totals['total_revenue'] or 0),
+            'exam_count': totals['exam_count'],
+            'subscription_count': totals['subscription_count'],
         })
     
+    return JsonResponse(response)
+
+
+PAYMENT_LEDGER_FIELDS = (
+    'id', 'transaction_id', 'payment_type', 'amount', 'payment_method', 'status', 'created_at',
+    'user__username', 'user__first_name', 'user__last_name', 'user__email',
+)
+
+
+def serialize_payment(row):
+    return {
+        'id': row['id'],
+        'transaction_id': row['transaction_id'],
+        'user_name': f"{row['user__first_name']} {row['user__last_name']}".strip() or row['user__username'],
+        'user_email': row['user__email'],
+        'payment_type': row['payment_type'],
+        'amount': str(row['amount']),
+        'payment_method': row['payment_method'],
+        'status': row['status'],
+        'created_at': row['created_at'].isoformat(),
+    }
+
+
+def stream_payments_csv(rows):
+    columns = ['transaction_id', 'user_name', 'user_email', 'payment_type', 'amount', 'payment_method', 'status', 'created_at']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        data = serialize_payment(row)
+        writer.writerow([data[column] for column in columns])
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@require_http_methods(["GET"])
+def health_check(request):
+    """
+    Liveness/readiness probe: 200 when the database and the cache answer,
+    503 otherwise. Only staff see which check failed and the database vendor.
+    """
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        checks['database'] = 'ok'
+    except Exception as e:
+        logger.error("Health check: database unavailable: %s", e)
+        checks['database'] = 'error'
+    try:
+        cache.set('health_check', 1, timeout=10)
+        checks['cache'] = 'ok' if cache.get('health_check') == 1 else 'error'
+    except Exception as e:
+        logger.error("Health check: cache unavailable: %s", e)
+        checks['cache'] = 'error'
+    
+    healthy = all(status == 'ok' for status in checks.values())
+    body = {'status': 'ok' if healthy else 'error'}
+    if request.user.is_staff:
+        body.update(database_vendor=connection.vendor, checks=checks)
+    response = JsonResponse(body, status=200 if healthy else 503)
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+@staff_member_required(login_url='/django-admin/login/')
+@require_http_methods(["GET"])
+def api_cache_stats(request):
+    """Hit/miss counters of this worker's in-memory caches"""
     return JsonResponse({
-        'payments': payments_data,
-        'total_revenue': float(total_revenue),
-        'exam_count': exam_count,
-        'subscription_count': subscription_count,
+        'answer_keys': answer_keys.stats(),
+        'module_payloads': module_payloads.stats(),
     })
 
 
@@ -965,7 +1329,7 @@ def api_pricing_settings(request):
     
     elif request.method == 'POST':
         data = json.loads(request.body)
-        settings = PricingSettings.get_settings()
+        settings = PricingSettings.load()
         settings.exam_price = data.get('exam_price')
         settings.subscription_price = data.get('subscription_price')
         settings.save()